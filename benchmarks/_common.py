@@ -0,0 +1,15 @@
+"""What the benchmark scripts share: importing the packages from any directory, and the exit status."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # the repository
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def finish(problems):
+    """Print the problems found, if any, and exit non-zero if there were some."""
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
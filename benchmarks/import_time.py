@@ -0,0 +1,62 @@
+"""Import-time benchmark for the envs.
+
+Importing the envs (what every training worker does) must not pull in the
+rendering or image-decoding libraries. From any directory:
+
+    python benchmarks/import_time.py [--budget SECONDS]
+
+Each import is timed in a fresh interpreter. Exits non-zero if pygame or
+matplotlib got imported or an import took longer than the budget.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+from _common import ROOT, finish
+
+MODULES = ("line_follower_v0.envs", "line_follower_v1.envs", "snake_ladder.envs")
+FORBIDDEN = ("pygame", "matplotlib")
+
+PROBE = """
+import json, sys, time
+import gymnasium  # the common dependency, not what is being measured
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, sorted(m for m in {forbidden!r} if m in sys.modules)]))
+"""
+
+
+def measure(module, repeat=5):
+    """Best of `repeat` import times in seconds, and the forbidden modules it imported."""
+    best, loaded = float("inf"), []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, forbidden=FORBIDDEN)],
+            capture_output=True, text=True, check=True, cwd=ROOT,
+        ).stdout
+        elapsed, loaded = json.loads(out.splitlines()[-1])
+        best = min(best, elapsed)
+    return best, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=0.15, help="seconds allowed per import (default: 0.15)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    problems = []
+    for module in MODULES:
+        elapsed, loaded = measure(module, args.repeat)
+        found = [f"imports {m}" for m in loaded]
+        if elapsed > args.budget:
+            found.append(f"over budget ({args.budget * 1000:.0f} ms)")
+        problems += [f"{module}: {problem}" for problem in found]
+        print(f"{module:24s} {elapsed * 1000:7.1f} ms  {'; '.join(found) or 'ok'}")
+    finish(problems)
+
+
+if __name__ == "__main__":
+    main()
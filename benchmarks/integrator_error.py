@@ -0,0 +1,86 @@
+"""Position error of the car integrators against step size.
+
+Integrates random constant wheel speeds for 1 s at several `dt` with each of
+`car.INTEGRATORS` and compares the final positions with the closed-form arc
+(one "exact" step of 1 s). From any directory:
+
+    python benchmarks/integrator_error.py [--cars N]
+
+Prints the table in the README's "Integrator" section. Exits non-zero if an
+error is over its bound (the README's numbers with some slack), if halving
+`dt` does not shrink the midpoint and RK4 errors at their order (2 and 4),
+if "exact" depends on `dt`, or if `integrate_scalar` disagrees with `integrate`.
+"""
+import argparse
+
+import numpy as np
+from _common import finish
+
+from line_follower_v0.envs.car import integrate, integrate_scalar
+
+DURATION = 1.0
+WIDTH = 80  # distance between the wheels of the default car, in pixels
+DTS = (0.2, 0.1, 0.05)
+# method, substeps, error bound in pixels at each of DTS, convergence order
+CASES = (
+    ("midpoint", 1, (2.5, 0.65, 0.16), 2),
+    ("rk4", 1, (1.5e-2, 1e-3, 6e-5), 4),
+    ("rk4", 4, (6e-5, 4e-6, 3e-7), 4),
+)
+
+
+def simulate(position, angle, left, right, dt, method, substeps=1):
+    for _ in range(round(DURATION / dt)):
+        position, angle = integrate(position, angle, left, right, dt, WIDTH, method, substeps)
+    return position, angle
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cars", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    position = rng.uniform(0, 500, (args.cars, 2))
+    angle = rng.uniform(-3, 3, args.cars)
+    left, right = rng.uniform(-300, 300, (2, args.cars))  # pixels per second
+    reference, _ = integrate(position, angle, left, right, DURATION, WIDTH, "exact")
+
+    problems = []
+    print(f"{'method':14s}" + "".join(f"  dt={dt:<10}" for dt in DTS))
+    for method, substeps, bounds, order in CASES:
+        errors = []
+        for dt in DTS:
+            final, _ = simulate(position, angle, left, right, dt, method, substeps)
+            errors.append(np.linalg.norm(final - reference, axis=-1).max())
+        name = method if method == "midpoint" else f"{method}, {substeps} sub"
+        print(f"{name:14s}" + "".join(f"  {e:8.2e} px" for e in errors))
+        for dt, error, bound in zip(DTS, errors, bounds):
+            if error > bound:
+                problems.append(f"{name} at dt={dt}: {error:.2e} px over {bound:.0e}")
+        for coarse, fine in zip(errors, errors[1:]):
+            # halving dt divides the error by about 2**order
+            if fine * 2**order > coarse * 1.5:
+                problems.append(f"{name}: error {coarse:.2e} -> {fine:.2e} px when halving dt, not order {order}")
+
+    # the closed-form arc is exact for constant wheel speeds: the step size must not matter
+    drift = max(np.linalg.norm(simulate(position, angle, left, right, dt, "exact")[0] - reference, axis=-1).max() for dt in DTS)
+    print(f"{'exact':14s}  {drift:8.2e} px at any dt")
+    if drift > 1e-8:
+        problems.append(f"exact depends on dt: {drift:.2e} px")
+
+    # the lean path's scalar twin
+    for method in ("midpoint", "exact", "rk4"):
+        for i in range(min(args.cars, 50)):
+            vector = integrate(position[i], angle[i], left[i], right[i], DTS[0], WIDTH, method, 2)
+            x, y, a = integrate_scalar(*position[i], angle[i], left[i], right[i], DTS[0], WIDTH, method, 2)
+            if not np.allclose((x, y, a), (*vector[0], vector[1]), rtol=0, atol=1e-9):
+                problems.append(f"integrate_scalar({method!r}) differs from integrate for car {i}")
+                break
+
+    finish(problems)
+
+
+if __name__ == "__main__":
+    main()
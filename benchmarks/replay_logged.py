@@ -0,0 +1,69 @@
+"""Replay check for episodes logged on a lean, rendering env.
+
+Logs a few episodes on a `LineFollowerEnv` made with `render_mode="rgb_array"`,
+`copy_frames=False`, `lean=True` and `copy_obs=False` (rendering every step),
+then replays them with `replay`, passing the same arguments. From any directory:
+
+    python benchmarks/replay_logged.py [--episodes N] [--steps N]
+
+The replay must accept those arguments, give the logged observations, rewards
+and done flags, and the same checksums as a replay without them. Episodes are
+kept within the horizon over which the lean step matches the default one.
+Exits non-zero on any difference.
+"""
+import argparse
+
+import gymnasium as gym
+import numpy as np
+from _common import finish
+
+import line_follower_v0  # noqa: F401, registers the envs
+from line_follower_v0.envs.replay import replay, replay_checksums
+
+ENV = dict(track="oval", max_steps=10**6)
+LOGGING = dict(render_mode="rgb_array", copy_frames=False, lean=True, copy_obs=False)
+
+
+def log(seed, steps, rng):
+    """(seed, actions) of an episode of random actions, and the logged observations, rewards and flags."""
+    env = gym.make("my_gym_envs/line_follower_v0", **ENV, **LOGGING).unwrapped
+    obs, _ = env.reset(seed=seed)
+    logged = {"obs": [obs.copy()], "reward": [], "terminated": [], "truncated": []}
+    actions = []
+    for _ in range(steps):
+        action = int(rng.integers(env.action_space.n))
+        obs, reward, terminated, truncated, _ = env.step(action)
+        env.render()
+        actions.append(action)
+        for key, value in zip(logged, (obs.copy(), reward, terminated, truncated)):
+            logged[key].append(value)
+        if terminated or truncated:
+            break
+    env.close()
+    return (seed, actions), {key: np.array(value) for key, value in logged.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--episodes", type=int, default=6)
+    parser.add_argument("--steps", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    episodes, logs = zip(*(log(seed, args.steps, rng) for seed in range(args.episodes)))
+    problems = []
+    try:
+        trajectories = replay(episodes, **ENV, **LOGGING)
+    except TypeError as error:
+        finish([f"replay rejects the logging arguments: {error}"])
+    for i, (trajectory, logged) in enumerate(zip(trajectories, logs)):
+        different = [key for key in logged if not np.array_equal(trajectory[key], logged[key])]
+        print(f"episode {i}: {len(episodes[i][1]):4d} steps  {'differs in ' + ', '.join(different) if different else 'ok'}")
+        problems += [f"episode {i}: replayed {key} differ from the logged ones" for key in different]
+    if replay_checksums(episodes, **ENV, **LOGGING) != replay_checksums(episodes, **ENV):
+        problems.append("the logging arguments change the replay's checksums")
+    finish(problems)
+
+
+if __name__ == "__main__":
+    main()
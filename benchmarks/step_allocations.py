@@ -0,0 +1,95 @@
+"""Allocation check for the lean step path.
+
+With `lean=True` a steady-state `step()` of the line follower must not allocate
+NumPy arrays beyond the returned observation: the pose is updated in place and
+the sensors are read into preallocated buffers, the observation being a copy of
+one of them (or, with `copy_obs=False`, that buffer itself). From any
+directory:
+
+    python benchmarks/step_allocations.py [--steps N] [--budget BYTES]
+
+A large sensor grid makes any temporary array at least 4 kB, far above the
+budget, while the Python floats, tuples and the info dict of a step stay below
+it. Each step is traced on its own with `tracemalloc`: the peak it reaches above
+the memory held before the step, less the returned observation's bytes, must
+stay within the budget, and the live NumPy allocations must be the same after
+all the steps as before. Copied observations must not share memory from one
+step to the next. The default (non-lean) step is measured too, for comparison.
+Exits non-zero if a lean step allocates.
+"""
+import argparse
+import tracemalloc
+
+import gymnasium as gym
+import numpy as np
+from _common import finish
+
+import line_follower_v0  # noqa: F401, registers the envs
+
+SENSOR_GRID = (64, 64)  # 4096 sensors: a bool temporary is 4 kB, an index one 32 kB
+
+
+def numpy_blocks():
+    """Number of live allocations made by NumPy (array data)."""
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)])
+    return sum(stat.count for stat in snapshot.statistics("filename"))
+
+
+def measure(steps, warmup=200, **kwargs):
+    """Worst per-step transient peak in bytes less the observation, the change in live NumPy
+    allocations over `steps` steps, and whether two observations shared memory."""
+    env = gym.make(
+        "my_gym_envs/line_follower_v0", track="oval", sensor_grid=SENSOR_GRID,
+        x_spacing=0.5, y_spacing=0.5, max_steps=10**9, **kwargs,
+    ).unwrapped  # the env itself, without the checker wrappers
+    env.reset(seed=0)
+    for i in range(warmup):
+        env.step(i % 3)
+    previous = env.step(0)[0]
+    aliased = np.shares_memory(previous, env.step(0)[0])
+    del previous
+
+    tracemalloc.start()
+    before = numpy_blocks()
+    worst = 0
+    for i in range(steps):
+        tracemalloc.reset_peak()
+        held, _ = tracemalloc.get_traced_memory()
+        result = env.step(i % 3)
+        _, peak = tracemalloc.get_traced_memory()
+        returned = 0 if result[0] is env._obs else result[0].nbytes  # a new observation array is allowed
+        worst = max(worst, peak - held - returned)
+        del result
+    grown = numpy_blocks() - before
+    tracemalloc.stop()
+    env.close()
+    return worst, grown, aliased
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--budget", type=int, default=1024, help="bytes a lean step may use transiently (default: 1024)")
+    args = parser.parse_args()
+
+    problems = []
+    modes = (dict(lean=False), dict(lean=True), dict(lean=True, copy_obs=False))
+    for kwargs in modes:
+        worst, grown, aliased = measure(args.steps, **kwargs)
+        found = []
+        lean, copied = kwargs["lean"], kwargs.get("copy_obs", True)
+        if lean and worst > args.budget:
+            found.append(f"over budget ({args.budget} B)")
+        if lean and grown:
+            found.append(f"{grown} new NumPy allocations")
+        if copied and aliased:
+            found.append("observations share memory")
+        status = "; ".join(found) or ("ok" if lean else "reference")
+        name = ", ".join(f"{key}={value}" for key, value in kwargs.items())
+        problems += [f"{name}: {problem}" for problem in found]
+        print(f"{name:29s} peak/step beyond the observation {worst:8d} B  live NumPy allocations {grown:+d}  {status}")
+    finish(problems)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Equivalence check for the batch-native vector wrappers.
+
+Each vector wrapper (`ClipVectorReward`, `DiscreteVectorActions`,
+`RelativeVectorPosition`, `ReacherVectorRewardWrapper`) must give the same
+observations, rewards and done flags, element for element, as a
+`SyncVectorEnv` of its single-env wrapper. From any directory:
+
+    python benchmarks/vector_wrappers.py [--envs N] [--steps N]
+
+The line follower wrappers run on line_follower_v1 (short episodes, so
+autoresets are covered), and also on its native vector env against restored
+single envs. The dict-observation and Reacher wrappers run on a small seeded
+toy env, since Reacher needs MuJoCo. Also prints the cost the wrappers add to
+a step of a large native vector env. Exits non-zero on any difference.
+"""
+import argparse
+import time
+
+import gymnasium as gym
+import numpy as np
+from _common import finish
+from gymnasium import spaces
+
+import line_follower_v1  # noqa: F401, registers the envs
+from line_follower_v0.wrappers.clip_reward import ClipReward, ClipVectorReward
+from line_follower_v0.wrappers.discrete_actions import DiscreteActions, DiscreteVectorActions
+from line_follower_v0.wrappers.reacher_weighted_reward import ReacherRewardWrapper, ReacherVectorRewardWrapper
+from line_follower_v0.wrappers.relative_position import RelativePosition, RelativeVectorPosition
+
+# wheel speeds of the discrete actions, the last one out of the action space (clipped by the env)
+TABLE = np.array([(0, 1), (1, 1), (1, 0), (0.5, 2)], dtype=np.float32) * 3
+LINE_FOLLOWER = dict(track="oval", max_steps=40, invert_waypoints=False, invert_colours=False)
+
+
+class ToyEnv(gym.Env):
+    """Seeded random dict observations and Reacher-style reward terms, ending at random."""
+    observation_space = spaces.Dict({"agent": spaces.Box(0, 10, (2,)), "target": spaces.Box(0, 10, (2,))})
+    action_space = spaces.Box(-1, 1, (2,))
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        return self._obs(), {}
+
+    def _obs(self):
+        return {key: self.np_random.uniform(0, 10, 2).astype(np.float32) for key in ("agent", "target")}
+
+    def step(self, action):
+        info = {"reward_dist": float(self.np_random.normal()), "reward_ctrl": float(-np.sum(np.square(action)))}
+        return self._obs(), 0.0, bool(self.np_random.random() < 0.1), False, info
+
+
+def line_follower():
+    return gym.make("my_gym_envs/line_follower_v1", **LINE_FOLLOWER)
+
+
+def equal(a, b):
+    """Same values and dtype, for arrays or dicts of arrays."""
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(equal(a[key], b[key]) for key in a)
+    a, b = np.asarray(a), np.asarray(b)
+    return a.dtype == b.dtype and np.array_equal(a, b)
+
+
+def compare(name, scalar, vector, actions, steps, seed=0):
+    """Step `scalar` (a SyncVectorEnv of single-env wrappers) and `vector` alike; a list of differences."""
+    results = [env.reset(seed=seed)[0] for env in (scalar, vector)]
+    problems = [] if equal(*results) else [f"{name}: reset observations differ"]
+    if scalar.single_action_space != vector.single_action_space:
+        problems.append(f"{name}: action spaces {scalar.single_action_space} and {vector.single_action_space}")
+    for t in range(steps):
+        action = actions()
+        expected, got = scalar.step(action), vector.step(action)
+        for field, a, b in zip(("observations", "rewards", "terminated", "truncated"), expected, got):
+            if not equal(a, b):
+                problems.append(f"{name}: {field} differ at step {t}")
+    print(f"{name:40s} {'ok' if not problems else 'DIFFERENT'}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--envs", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--bench-envs", type=int, default=4096)
+    args = parser.parse_args()
+    n = args.envs
+    rng = np.random.default_rng(0)
+    discrete = lambda: rng.integers(0, len(TABLE), n)
+    continuous = lambda: rng.uniform(-4, 4, (n, 2)).astype(np.float32)
+    sync = lambda make: gym.vector.SyncVectorEnv([make] * n)
+
+    problems = []
+    problems += compare(
+        "ClipVectorReward",
+        sync(lambda: ClipReward(line_follower(), 0.5, 1.5)),
+        ClipVectorReward(sync(line_follower), 0.5, 1.5),
+        continuous, args.steps,
+    )
+    problems += compare(
+        "DiscreteVectorActions",
+        sync(lambda: DiscreteActions(line_follower(), TABLE)),
+        DiscreteVectorActions(sync(line_follower), TABLE),
+        discrete, args.steps,
+    )
+    problems += compare(
+        "RelativeVectorPosition",
+        sync(lambda: RelativePosition(ToyEnv())),
+        RelativeVectorPosition(sync(ToyEnv)),
+        continuous, args.steps,
+    )
+    problems += compare(
+        "ReacherVectorRewardWrapper",
+        sync(lambda: ReacherRewardWrapper(ToyEnv(), 0.7, 0.1)),
+        ReacherVectorRewardWrapper(sync(ToyEnv), 0.7, 0.1),
+        continuous, args.steps,
+    )
+
+    # on the native vector env, against single envs restored to the same cars
+    native = ClipVectorReward(DiscreteVectorActions(
+        gym.make_vec("my_gym_envs/line_follower_v1", num_envs=n, vectorization_mode="vector_entry_point", **LINE_FOLLOWER), TABLE,
+    ), 0.5, 1.5)
+    singles = [ClipReward(DiscreteActions(line_follower(), TABLE), 0.5, 1.5) for _ in range(n)]
+    native.reset(seed=0)
+    for k, env in enumerate(singles):
+        env.reset(seed=0)
+        env.unwrapped.set_state(native.unwrapped.get_states([k])[0])
+    different = False
+    for t in range(30):  # within the first episode: the native env autoresets with its own RNG
+        action = discrete()
+        obs, reward, terminated, truncated, _ = native.step(action)
+        for k, env in enumerate(singles):
+            expected = env.step(int(action[k]))[:4]
+            if not all(np.array_equal(a, b[k]) for a, b in zip(expected, (obs, reward, terminated, truncated))):
+                different = True
+    print(f"{'native vector env vs restored envs':40s} {'DIFFERENT' if different else 'ok'}")
+    if different:
+        problems.append("clip + discrete on the native vector env differ from the single-env wrappers")
+
+    # what the wrappers add to a step of a big batch
+    m = args.bench_envs
+    raw = gym.make_vec("my_gym_envs/line_follower_v1", num_envs=m, vectorization_mode="vector_entry_point", track="oval")
+    wrapped = ClipVectorReward(DiscreteVectorActions(
+        gym.make_vec("my_gym_envs/line_follower_v1", num_envs=m, vectorization_mode="vector_entry_point", track="oval"), TABLE,
+    ), 0, 1)
+    action = rng.integers(0, len(TABLE), m)
+    for env, act in ((raw, TABLE[action]), (wrapped, action)):
+        env.reset(seed=0)
+        start = time.perf_counter()
+        for _ in range(50):
+            env.step(act)
+        print(f"{m} cars, {'wrapped' if env is wrapped else 'raw':7s} {(time.perf_counter() - start) / 50 * 1000:6.2f} ms/step")
+
+    finish(problems)
+
+
+if __name__ == "__main__":
+    main()
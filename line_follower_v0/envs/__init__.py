@@ -1 +1,4 @@
-from .main import LineFollowerEnv
+from .main import EnvState, LineFollowerEnv, unpack_obs
+from .vector import LineFollowerVectorEnv
+from .pool import LineFollowerPoolEnv
+from .multi import LineFollowerMultiEnv
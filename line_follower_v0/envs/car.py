@@ -1,5 +1,7 @@
+import math
+from functools import lru_cache
+
 import numpy as np
-import pygame
 
 def to_pygame(points, height=500):
     """
@@ -18,7 +20,12 @@ def to_pygame(points, height=500):
     return points_flipped
 
 def rotate_points(points, theta):
-    theta -= np.pi/2
+    theta = np.asarray(theta) - np.pi/2
+    if theta.ndim:
+        # one rotated copy of `points` per angle, shape (len(theta), n, 2)
+        c, s = np.cos(theta)[:, None], np.sin(theta)[:, None]
+        x, y = points[:, 0], points[:, 1]
+        return np.stack((c*x - s*y, s*x + c*y), axis=-1)
     # Create the rotation matrix (taking into account the y-axis pointing down)
     rotation_matrix = np.array([[np.cos(theta), -np.sin(theta)],
                                 [np.sin(theta), np.cos(theta)]])
@@ -26,7 +33,207 @@ def rotate_points(points, theta):
     rotated_points = np.dot(rotation_matrix, points.T).T
     return rotated_points
 
+def sense(image, sensors, inverted=False):
+    """Read the track under any number of sensors in one gather.
+
+    Args:
+        image (np.array): Boolean track image of shape (height, width).
+        sensors (np.array): Sensor positions in pygame coordinates, shape (..., 2).
+            Any leading shape works, e.g. (n, 2) for one car or (cars, n, 2) for many.
+        inverted (bool or np.array, optional): Flip the reading, broadcast against
+            the leading shape of `sensors`. Defaults to False.
+
+    Returns:
+        np.array: Boolean array of shape `sensors.shape[:-1]`. Sensors outside the
+            image (including negative coordinates) read as off-track.
+    """
+    pixels = np.floor(sensors).astype(np.intp)
+    col, row = pixels[..., 0], pixels[..., 1]
+    h, w = image.shape
+    inside = (row >= 0) & (row < h) & (col >= 0) & (col < w)
+    vals = image[np.where(inside, row, 0), np.where(inside, col, 0)]
+    return (vals ^ inverted) & inside
+
+@lru_cache(maxsize=None)
+def sensor_table(sensor_grid=(4, 6), x_spacing=20, y_spacing=20, max_error=0.5):
+    """Precompute the rotated sensor offsets of a sensor layout for K quantized headings.
+
+    The heading is rounded to the nearest of K = ceil(pi * r / max_error) evenly
+    spaced angles, where r is the distance of the furthest sensor from the car's
+    centre. Rounding the heading by at most pi / K moves a sensor at radius r by
+    at most 2 * r * sin(pi / (2 * K)) < r * pi / K <= max_error pixels, so with the
+    default of half a pixel a sensor reads at most one pixel away from the exact
+    position. Tables are cached per (layout, max_error) and shared between cars.
+
+    Args:
+        sensor_grid (tuple): (rows, cols) of the sensor grid.
+        x_spacing (float): Distance between sensor columns in pixels.
+        y_spacing (float): Distance between sensor rows in pixels.
+        max_error (float): Largest allowed sensor displacement in pixels.
+
+    Returns:
+        np.array: Read-only array of shape (K, n, 2); entry k holds the sensor offsets
+            for heading `2 * pi * k / K`.
+    """
+    rows, columns = sensor_grid
+    points = Car._get_sensor_points_(rows*y_spacing, columns*x_spacing, rows, columns)
+    radius = np.linalg.norm(points, axis=1).max()
+    headings = max(int(np.ceil(np.pi * radius / max_error)), 1)
+    table = rotate_points(points, 2*np.pi*np.arange(headings) / headings)
+    table.flags.writeable = False
+    return table
+
+def lookup_sensors(table, angle):
+    """Rotated sensor offsets for `angle` (scalar or array) from a `sensor_table`."""
+    headings = len(table)
+    idx = np.rint(np.asarray(angle) * (headings / (2*np.pi))).astype(np.intp) % headings
+    return table[idx]
+
+INTEGRATORS = ("midpoint", "exact", "rk4")
+
+def integrate(position, angle, speed_left_wheel, speed_right_wheel, dt, width, method="exact", substeps=1):
+    """Advance differential-drive cars with constant wheel speeds over `dt`.
+
+    Works on a single car or, with array arguments, on many cars at once.
+
+    - "midpoint": moves `v * dt` along the average of the old and new heading
+      (what `Car.move` has always done). The error grows with the turn per step.
+    - "exact": the closed-form arc around the instantaneous centre of curvature.
+      The chord of the arc has length `v * dt * sin(a) / a` with `a` half the
+      change in heading, along the midpoint heading, so it is the midpoint rule
+      scaled by `sinc` and stays well defined when driving straight.
+    - "rk4": classic 4th order Runge-Kutta on (x, y, angle), split into `substeps`.
+
+    Args:
+        position (np.array): Shape (..., 2), in the car's (y-up) frame.
+        angle (float or np.array): Shape (...), heading in radians.
+        speed_left_wheel (float or np.array): Already scaled to pixels per unit time.
+        speed_right_wheel (float or np.array): Same units as the left wheel.
+        dt (float): Change in time.
+        width (float): Distance between the wheels.
+        method (str, optional): One of `INTEGRATORS`. Defaults to "exact".
+        substeps (int, optional): Number of sub-steps for "rk4". Defaults to 1.
+
+    Returns:
+        position (np.array): New positions, same shape as `position`.
+        angle (np.array): New headings, same shape as `angle`.
+    """
+    v = (speed_right_wheel + speed_left_wheel) / 2
+    omega = (speed_right_wheel - speed_left_wheel) / width
+    if method == "rk4":
+        h = dt / substeps
+        x, y = position[..., 0], position[..., 1]
+        for _ in range(substeps):
+            # d(x, y, angle)/dt = (v cos(angle), v sin(angle), omega)
+            a1 = angle
+            a2 = angle + h/2*omega
+            a4 = angle + h*omega
+            x = x + h*v/6 * (np.cos(a1) + 4*np.cos(a2) + np.cos(a4))
+            y = y + h*v/6 * (np.sin(a1) + 4*np.sin(a2) + np.sin(a4))
+            angle = a4
+        return np.stack((x, y), axis=-1), angle
+
+    change_in_angle = omega * dt
+    movement_angle = angle + change_in_angle / 2
+    distance_moved = v * dt
+    if method == "exact":
+        distance_moved = distance_moved * np.sinc(change_in_angle / (2*np.pi))
+    elif method != "midpoint":
+        raise ValueError(f"Unknown integrator {method!r}, expected one of {INTEGRATORS}.")
+    direction = np.stack((np.cos(movement_angle), np.sin(movement_angle)), axis=-1)
+    return position + np.asarray(distance_moved)[..., None] * direction, angle + change_in_angle
+
+def integrate_scalar(x, y, angle, speed_left_wheel, speed_right_wheel, dt, width, method="exact", substeps=1):
+    """`integrate` for a single car on Python floats, allocating no arrays (the lean step path).
+
+    Returns:
+        (float, float, float): New x, y and heading.
+    """
+    v = (speed_right_wheel + speed_left_wheel) / 2
+    omega = (speed_right_wheel - speed_left_wheel) / width
+    if method == "rk4":
+        h = dt / substeps
+        for _ in range(substeps):
+            a2 = angle + h/2*omega
+            a4 = angle + h*omega
+            x += h*v/6 * (math.cos(angle) + 4*math.cos(a2) + math.cos(a4))
+            y += h*v/6 * (math.sin(angle) + 4*math.sin(a2) + math.sin(a4))
+            angle = a4
+        return x, y, angle
+
+    change_in_angle = omega * dt
+    movement_angle = angle + change_in_angle / 2
+    distance_moved = v * dt
+    if method == "exact":
+        if change_in_angle:
+            distance_moved *= math.sin(change_in_angle / 2) / (change_in_angle / 2)
+    elif method != "midpoint":
+        raise ValueError(f"Unknown integrator {method!r}, expected one of {INTEGRATORS}.")
+    return x + distance_moved * math.cos(movement_angle), y + distance_moved * math.sin(movement_angle), angle + change_in_angle
+
+class SensorReader:
+    """Reads one car's sensors like `sense(image, to_pygame(car.get_sensors()))`, into buffers allocated once.
+
+    Every intermediate (rotated points, pixel indices, bounds mask) has its own
+    preallocated float32 / intp / bool buffer and all NumPy calls write with
+    `out=`, so a reading allocates no arrays. Used by lean cars.
+    """
+    __slots__ = ("points", "table", "rotation", "coords", "x", "y", "pixels", "col", "row", "col_unsigned", "row_unsigned",
+                 "flat", "inside", "outside", "height", "image", "flat_image")
+
+    def __init__(self, sensor_points, sensor_table=None, height=500):
+        n = len(sensor_points)
+        self.points = sensor_points.astype(np.float32)
+        # one (n, 2) view per heading, y already flipped to pygame coordinates
+        self.table = None if sensor_table is None else list((sensor_table * (1, -1)).astype(np.float32))
+        self.rotation = np.zeros((2, 2), dtype=np.float32)
+        self.coords = np.zeros((n, 2), dtype=np.float32)
+        # translated one column at a time: broadcasting a (2,) offset over the rows buffers a copy
+        self.x, self.y = self.coords[:, 0], self.coords[:, 1]
+        self.pixels = np.zeros((n, 2), dtype=np.intp)
+        self.col, self.row = self.pixels[:, 0], self.pixels[:, 1]
+        # negative indices wrap around to huge unsigned ones, so one comparison checks both bounds
+        self.col_unsigned, self.row_unsigned = self.col.view(np.uintp), self.row.view(np.uintp)
+        self.flat = np.zeros(n, dtype=np.intp)
+        self.inside = np.zeros(n, dtype=bool)
+        self.outside = np.zeros(n, dtype=bool)
+        self.height = height
+        self.image = self.flat_image = None
+
+    def read(self, image, position, angle, out):
+        """Write the readings for a car at `position` (car frame) heading `angle` into the bool array `out`."""
+        if image is not self.image:
+            self.image, self.flat_image = image, image.reshape(-1)
+        if self.table is None:
+            # rotate_points by angle - pi/2, then flip y: x' = c*px - s*py, y' = -(s*px + c*py)
+            c, s = math.cos(angle - math.pi/2), math.sin(angle - math.pi/2)
+            rotation = self.rotation
+            rotation[0, 0], rotation[0, 1], rotation[1, 0], rotation[1, 1] = c, -s, -s, -c
+            np.matmul(self.points, rotation, out=self.coords)
+        else:
+            headings = len(self.table)
+            np.copyto(self.coords, self.table[round(angle * (headings / (2*math.pi))) % headings])
+        np.add(self.x, float(position[0]), out=self.x)
+        np.add(self.y, self.height - float(position[1]), out=self.y)
+        np.floor(self.coords, out=self.coords)
+        np.copyto(self.pixels, self.coords, casting="unsafe")
+
+        h, w = image.shape
+        np.less(self.col_unsigned, w, out=self.inside)
+        np.less(self.row_unsigned, h, out=self.outside)
+        np.logical_and(self.inside, self.outside, out=self.inside)
+        np.logical_not(self.inside, out=self.outside)
+        np.multiply(self.row, w, out=self.flat)
+        np.add(self.flat, self.col, out=self.flat)
+        np.copyto(self.flat, 0, where=self.outside)  # off-image sensors read pixel 0 ...
+        np.take(self.flat_image, self.flat, out=out, mode="clip")
+        np.logical_and(out, self.inside, out=out)  # ... and are then switched off
+        return out
+
 class Car:
+    __slots__ = ("sensor_table", "integrator", "substeps", "sensor_grid", "width", "height", "pos0", "ang0",
+                 "angle", "position", "sensors", "corners", "sensor_points", "lean", "reader")
+
     def __init__(
         self,
         sensor_grid = (4, 6),
@@ -34,7 +241,17 @@ class Car:
         angle = np.pi/8,
         x_spacing=20,
         y_spacing=20,
+        sensor_table=None,
+        integrator="midpoint",
+        substeps=1,
+        lean=False,
     ):
+        # lean: float32 pose updated in place and sensors read into preallocated buffers,
+        # so `move` and `get_state(image, out)` allocate no arrays (see `LineFollowerEnv`)
+        self.lean = lean
+        self.sensor_table = sensor_table  # from `sensor_table()`; None senses at the exact heading
+        self.integrator = integrator  # see `integrate`
+        self.substeps = substeps
         self.sensor_grid = sensor_grid  # (rows, cols)
         self.width  = sensor_grid[0]*y_spacing
         self.height = sensor_grid[1]*x_spacing  # (width, height) in pixels
@@ -51,8 +268,14 @@ class Car:
             ]
         )
         self.sensor_points = self._get_sensor_points_(self.width, self.height, *sensor_grid)
+        self.reader = SensorReader(self.sensor_points, sensor_table) if lean else None
         
     def reset(self):
+        if self.lean:
+            # a buffer of our own, `move` writes into it
+            self.angle = np.float32(self.ang0)
+            self.position = np.array(self.pos0, dtype=np.float32)
+            return
         self.angle = self.ang0
         self.position = self.pos0
 
@@ -67,6 +290,16 @@ class Car:
         sensors = rotate_points(self.sensor_points, self.angle) + self.position
         return corners, sensors
 
+    def get_sensors(self):
+        """Get the sensor points of the car, from `sensor_table` if the car has one.
+
+        Returns:
+            sensors (np.array): Array of shape (n, 2) containing the x and y coordinates of the sensors of the car.
+        """
+        if self.sensor_table is None:
+            return rotate_points(self.sensor_points, self.angle) + self.position
+        return lookup_sensors(self.sensor_table, self.angle) + self.position
+
     def move(self, speed_left_wheel, speed_right_wheel, dt):
         """Move the car forward in time. Update the position and angle of the car.
 
@@ -82,7 +315,20 @@ class Car:
         speed_left_wheel *= 100
         speed_right_wheel *= 100
 
-        if speed_right_wheel == speed_left_wheel:
+        if self.lean:
+            x, y, angle = integrate_scalar(
+                float(current_location[0]), float(current_location[1]), float(current_angle),
+                float(speed_left_wheel), float(speed_right_wheel), dt,
+                distance_between_wheels, self.integrator, self.substeps,
+            )
+            current_location[0], current_location[1] = x, y
+            self.angle = np.float32(angle)
+        elif self.integrator != "midpoint":
+            self.position, self.angle = integrate(
+                current_location, current_angle, speed_left_wheel, speed_right_wheel, dt,
+                distance_between_wheels, self.integrator, self.substeps,
+            )
+        elif speed_right_wheel == speed_left_wheel:
             distance_moved = speed_right_wheel * dt
             new_x = current_location[0] + distance_moved * np.cos(current_angle)
             new_y = current_location[1] + distance_moved * np.sin(current_angle)
@@ -117,21 +363,25 @@ class Car:
             color (tuple, optional): The color of the car. Defaults to a dark blue.
             vals (iterable): values read by the sensors
             sensor_color (tuple, optional): The colour if the sensor is activated. Defaults to red.
+
+        Returns:
+            list[pygame.Rect]: The area drawn on, for dirty-rectangle updates.
         """
+        import pygame
         corners, sensors = self.get_car()
         
         # draw the car
         # print(to_pygame(corners), "\n")
-        pygame.draw.polygon(screen, color, to_pygame(corners), 2)
-        
+        body = pygame.draw.polygon(screen, color, to_pygame(corners), 2)
+        rects = []
 
         # draw the sensors
         for sensor in sensors:
-            pygame.draw.circle(screen, color, to_pygame(sensor), 4, 1)
+            rects.append(pygame.draw.circle(screen, color, to_pygame(sensor), 4, 1))
             
 
         # put a red line to mark the front of the car
-        pygame.draw.line(screen, (255, 0, 0), to_pygame(np.mean(corners, axis=0)), to_pygame(np.mean(corners[2:], axis=0)), 2)
+        rects.append(pygame.draw.line(screen, (255, 0, 0), to_pygame(np.mean(corners, axis=0)), to_pygame(np.mean(corners[2:], axis=0)), 2))
         
         # pygame.draw.circle(screen, (0, 255, 0), to_pygame(corners[0]), 4, 2)  # colour = yellow
 
@@ -141,31 +391,42 @@ class Car:
                 raise ValueError(f"Number of sensors and number of values must be the same. Got {len(sensors)} sensors and {len(vals)} values.")
             for sensor, val in zip(sensors, vals):
                 if val: pygame.draw.circle(screen, sensor_color, to_pygame(sensor), 4)
+        return [body.unionall(rects)]
     
-    def get_state(self, image):
+    def get_state(self, image, out=None):
         """Get the values read by the sensors.
 
         Args:
             image (np.array): The image on which the sensors are to be used.
+            out (np.array, optional): Bool array of shape (n,) to write the values into;
+                a lean car then allocates nothing. Defaults to None.
 
         Returns:
             np.array: Array of shape (n,) containing the values read by the sensors.
         """
-        sensors = to_pygame(self.get_car()[1])
-        # print(sensors)
-        vals = []
-        for sensor in sensors:
-            # print(sensor)
-            # print(image[int(sensor[1]), int(sensor[0])])
-            try:
-                got = image[int(sensor[1]), int(sensor[0])]
-            except IndexError:
-                got = False
-            vals.append(got)
-        return np.array(vals)
+        if out is None:
+            return sense(image, to_pygame(self.get_sensors()))
+        if self.lean:
+            return self.reader.read(image, self.position, float(self.angle), out)
+        np.copyto(out, sense(image, to_pygame(self.get_sensors())))
+        return out
 
+    @staticmethod
+    def get_states(cars, image):
+        """Get the values read by the sensors of several cars on the same image.
+
+        Args:
+            cars (list[Car]): Cars with the same sensor layout.
+            image (np.array): The image on which the sensors are to be used.
+
+        Returns:
+            np.array: Array of shape (len(cars), n).
+        """
+        return sense(image, to_pygame(np.stack([car.get_sensors() for car in cars])))
 
-    def _get_sensor_points_(self, height, width, rows, columns):
+
+    @staticmethod
+    def _get_sensor_points_(height, width, rows, columns):
         """Get the positions of the sensors in the car's frame of reference."""
         # in goes number of sensors and the height and width of the car
         # out comes the position of sensors in the car's frame of reference
@@ -180,30 +441,77 @@ class Car:
 
 
 class Coins:
-    def __init__(self, coins, car, radius=30):
+    __slots__ = ("coins", "radius", "car", "start", "window", "cursor", "lean", "_points")
+
+    def __init__(self, coins, car, radius=30, start=0, window=4, lean=False):
+        """Coins to be collected in order along a read-only waypoint array.
+
+        Args:
+            coins (np.array): Waypoints of shape (n, 2) in pygame coordinates. Never modified.
+            car (Car): The car collecting the coins.
+            radius (float, optional): Hitbox radius around each coin. Defaults to 30.
+            start (int, optional): Index of the first coin to collect. Defaults to 0.
+            window (int, optional): How many upcoming coins are checked at once. Defaults to 4.
+            lean (bool, optional): Check coins one at a time on Python floats, allocating
+                no arrays. Defaults to False.
+        """
         self.coins = coins
         self.radius = radius
         self.car = car
-        # print(*coins, sep="\n")
-        # print(coins[:, 0].min(), coins[:, 0].max())
-        # print(coins[:, 1].min(), coins[:, 1].max())
-        # quit()
+        self.start = start
+        self.window = window
+        self.cursor = 0  # coins collected so far, the next one is coins[(start + cursor) % n]
+        self.lean = lean
+        self._points = coins.tolist() if lean else None
+
+    @property
+    def laps(self):
+        return self.cursor // len(self.coins)
+
+    def upcoming(self, count):
+        """Indices of the next `count` coins, in collection order."""
+        return (self.start + self.cursor + np.arange(count)) % len(self.coins)
 
     def get_reward(self):
+        if self.lean:
+            return self._get_reward_lean()
         position = to_pygame(self.car.position)
         # position = self.car.position
         reward = 0
-        while reward<len(self.coins):
-            # the coins have to be collected in order
-            coin = self.coins[0]
-            if not np.linalg.norm(position - coin) < self.radius:
+        n = len(self.coins)
+        while reward<n:
+            # the coins have to be collected in order, so only the leading run of hits counts
+            window = min(self.window, n - reward)
+            hits = np.linalg.norm(self.coins[self.upcoming(window)] - position, axis=1) < self.radius
+            run = window if hits.all() else int(hits.argmin())
+            reward += run
+            self.cursor += run
+            if run < window:
                 break
-            reward += 1
-            self.coins = np.roll(self.coins, -1, axis=0)
         # if reward: print(reward)
         return reward
 
+    def _get_reward_lean(self):
+        position = self.car.position
+        x, y = float(position[0]), 500 - float(position[1])  # to_pygame
+        points = self._points
+        n = len(points)
+        reward = 0
+        while reward < n:
+            coin_x, coin_y = points[(self.start + self.cursor) % n]
+            if math.hypot(coin_x - x, coin_y - y) >= self.radius:
+                break
+            reward += 1
+            self.cursor += 1
+        return reward
+
     def display(self, screen):
+        """Draw the upcoming coins and the car's hitbox.
+
+        Returns:
+            list[pygame.Rect]: The areas drawn on, for dirty-rectangle updates.
+        """
+        import pygame
         YELLOW = (255, 255, 0)
         GREEN = (0, 255, 0)
         DEEP_ORANGE = (255, 140, 0)
@@ -213,18 +521,22 @@ class Coins:
         coin_color = DEEP_ORANGE
         border_color = RED
 
-        for i, coin in enumerate(self.coins, start=1):
+        rects = []
+        # only the next ~10% of the coins are drawn, starting from the cursor
+        for i, idx in enumerate(self.upcoming(len(self.coins)), start=1):
+            coin = self.coins[idx]
             t = i / len(self.coins)
             rad = max(int(max_rad * (1 - 10*t) + 1), 0)
             
             if rad <= 0:
-                continue
+                break
             
             # First, draw the main filled yellow circle
             # pygame.draw.circle(screen, coin_color, coin, rad)
-            pygame.draw.circle(screen, coin_color, coin, max_rad)
+            rects.append(pygame.draw.circle(screen, coin_color, coin, max_rad))
             
             # Then, draw the orange border on top
             pygame.draw.circle(screen, border_color, coin, max_rad, 1)
 
-        pygame.draw.circle(screen, GREEN, to_pygame(self.car.position), self.radius, 1)
\ No newline at end of file
+        rects.append(pygame.draw.circle(screen, GREEN, to_pygame(self.car.position).tolist(), self.radius, 1))
+        return rects
\ No newline at end of file
@@ -1,11 +1,16 @@
 import gymnasium as gym
 from gymnasium import spaces
-import pygame, os, random
+import copy
+import os
+from collections import namedtuple
 import numpy as np
-from matplotlib import image
 from importlib import resources
 
-from .car import Car, Coins, to_pygame
+from .car import Car, Coins, to_pygame, sensor_table, INTEGRATORS
+from .procedural import procedural_spec, procedural_track
+from .raster import Rasterizer
+from .store import TrackStore
+from .track import BUNDLE_SUFFIX, TrackCache, rgb2gray
 
 WIDTH, HEIGHT = 800, 500
 
@@ -16,9 +21,7 @@ WHITE  = (255, 255, 255)  # #FFFFFF
 BLACK  = (  0,   0,   0)  # #000000
 YELLOW = (255, 255,   0)  # #FFFF00
 
-def rgb2gray(rgb):
-    return np.dot(rgb[..., :4], [0.25, 0.25, 0.25, 0.25])
-
+XRGB = (0xFF0000, 0x00FF00, 0x0000FF, 0)  # pixel format of the canvas, see `render_raw`
 
 # action_to_inputs = np.array((
 #     (-1.0, +1.0),  # slow down left wheel
@@ -32,10 +35,45 @@ action_to_inputs = np.array((
     (1, 0),  # slow down right wheel
 ))*3
 
+# Everything `step()` changes, see `LineFollowerEnv.get_state`. `track` is the shared,
+# read-only `Track` (colour inversion included), `position` is in the car's (y-up) frame
+# and `rng` is the state of `np_random`'s bit generator.
+EnvState = namedtuple("EnvState", ["track", "reversed", "position", "angle", "start", "cursor", "curr_step", "rng"])
+
+
+def packed_obs_space(n):
+    """Space of `n` sensor bits packed into one unsigned integer word."""
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if n <= np.iinfo(dtype).bits:
+            return spaces.Box(low=0, high=2**n - 1, shape=(), dtype=dtype)
+    raise ValueError(f"Can't pack {n} sensors into one word (at most 64).")
+
+def pack_obs(vals, dtype):
+    """Pack sensor readings of shape (..., n) into words, sensor i in bit i."""
+    weights = np.left_shift(np.uint64(1), np.arange(vals.shape[-1], dtype=np.uint64))
+    return np.asarray(vals @ weights).astype(dtype)
+
+def pixels_obs_space(rasterizer):
+    return spaces.Box(low=0, high=255, shape=(*rasterizer.shape, rasterizer.channels), dtype=np.uint8)
+
+def xrgb_to_rgb(raw, out=None):
+    """Packed 0xRRGGBB pixels (..., height, width) from `render_raw` to uint8 RGB (..., height, width, 3)."""
+    if out is None:
+        out = np.empty((*raw.shape, 3), dtype=np.uint8)
+    for channel, shift in enumerate((16, 8, 0)):
+        np.right_shift(raw, shift, out=out[..., channel], casting="unsafe")
+    return out
+
+def unpack_obs(obs, n):
+    """Inverse of `pack_obs`, for the learner side: words of shape (...) to bools of shape (..., n)."""
+    obs = np.asarray(obs, dtype=np.uint64)
+    return ((obs[..., None] >> np.arange(n, dtype=np.uint64)) & 1).astype(bool)
+
 
 class LineFollowerEnv(gym.Env):
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 30}
     USER_TRACK_PATHS = []
+    track_cache = TrackCache(maxsize=16)  # shared by every env in the process
 
     @classmethod
     def add_track_folder(cls, folder):
@@ -45,7 +83,7 @@ class LineFollowerEnv(gym.Env):
     def __init__(
         self, render_mode=None,
         sensor_grid = (4, 6),
-        track="path",  # options = ["path", "path2"]
+        track="path",  # a track name, or a procedural spec: "random", "random:<seed>" or a dict
         max_steps=200,
         hitbox=20,
         x_spacing=20,
@@ -53,6 +91,20 @@ class LineFollowerEnv(gym.Env):
         verbose=False,
         invert_waypoints=None,
         invert_colours=None,
+        sensor_lut_error=None,
+        packed_track=False,
+        obs_mode="binary",  # options = ["binary", "packed", "pixels"]
+        pixels=None,
+        track_store=None,
+        max_distance=None,
+        dt=0.05,
+        frame_skip=1,
+        step_unit="agent",  # options = ["agent", "tick"]
+        integrator="midpoint",  # options = ["midpoint", "exact", "rk4"]
+        substeps=1,
+        copy_frames=True,
+        lean=False,
+        copy_obs=True,
     ):
         self.sensor_grid = sensor_grid
         self.track = track
@@ -63,13 +115,55 @@ class LineFollowerEnv(gym.Env):
         self.verbose = verbose
         self.invert_waypoints = invert_waypoints
         self.invert_colours = invert_colours
-
-        self.observation_space = spaces.MultiBinary(
-            (sensor_grid[0] * sensor_grid[1],)
+        self.max_distance = max_distance  # terminate once this far (pixels) from the centerline
+        self.dt = dt  # time step of one physics tick
+        self.frame_skip = frame_skip  # physics ticks per agent step, the action is repeated
+        # what `max_steps` counts: agent steps, or physics ticks (frame_skip per step)
+        assert step_unit in ("agent", "tick")
+        self.step_unit = step_unit
+        assert integrator in INTEGRATORS
+        self.integrator = integrator  # how `Car.move` integrates one tick, see `integrate`
+        self.substeps = substeps  # sub-steps per tick for "rk4"
+        # None: exact sensor rotation; else the max sensor error in pixels, see `sensor_table`
+        self.sensor_table = None if sensor_lut_error is None else sensor_table(
+            tuple(sensor_grid), x_spacing, y_spacing, sensor_lut_error
         )
 
+        self.packed_track = packed_track  # keep the track mask bit-packed, see `PackedMask`
+        # True or a directory: share decoded tracks between processes, see `TrackStore`
+        self.track_store = None
+        if track_store:
+            self.track_store = TrackStore.open(None if track_store is True else track_store)
+        assert obs_mode in ("binary", "packed", "pixels")
+        self.obs_mode = obs_mode
+        self.rasterizer = None
+
+        if obs_mode == "packed":
+            # all sensors in one integer word, unpack with `unpack_obs`
+            self.observation_space = packed_obs_space(sensor_grid[0] * sensor_grid[1])
+        elif obs_mode == "pixels":
+            # headless image of the track around the car, `pixels` are `Rasterizer` options
+            self.rasterizer = Rasterizer(
+                car_size=(sensor_grid[0] * y_spacing, sensor_grid[1] * x_spacing), **(pixels or {})
+            )
+            self.observation_space = pixels_obs_space(self.rasterizer)
+        else:
+            self.observation_space = spaces.MultiBinary(
+                (sensor_grid[0] * sensor_grid[1],)
+            )
+
         self.action_space = spaces.Discrete(len(action_to_inputs))
 
+        # allocation-free step: float32 pose updated in place, scalar math, and the sensors read
+        # into one reusable bool buffer, see `Car`'s `lean`; returned as a copy unless not `copy_obs`
+        self.lean = lean
+        self.copy_obs = copy_obs
+        self._obs = None
+        if lean:
+            assert obs_mode == "binary" and not packed_track, "lean needs obs_mode='binary' and an unpacked track"
+            self._obs = np.zeros(sensor_grid[0] * sensor_grid[1], dtype=bool)
+            self._speeds = [tuple(float(v) for v in row) for row in action_to_inputs]
+
         assert render_mode is None or render_mode in self.metadata["render_modes"]
         self.render_mode = render_mode
 
@@ -83,12 +177,30 @@ class LineFollowerEnv(gym.Env):
         self.window = None
         self.clock = None
         self.curr_step = None
+
+        # persistent render target, see `_render_frame`
+        self.copy_frames = copy_frames
+        self.canvas = None
+        self._canvas_background = None
+        self._dirty = []
+        self._frame = None
+        self.viewer = None  # see `attach_viewer`
         
-    def load_track(self, track: str):
+    @classmethod
+    def find_track(cls, track: str):
+        """Resolve a track name to its (png_path, npy_path), user folders first.
+
+        A compiled bundle (`<track>.track.npz`, see `Track.save_bundle`) is
+        preferred over the loose files of the same folder, and is returned as
+        (bundle_path, None).
+        """
         png_path = npy_path = None
 
         # First look in user folders
-        for folder in self.USER_TRACK_PATHS:
+        for folder in cls.USER_TRACK_PATHS:
+            candidate_bundle = os.path.join(folder, f"{track}{BUNDLE_SUFFIX}")
+            if os.path.exists(candidate_bundle):
+                return candidate_bundle, None
             candidate_png = os.path.join(folder, f"{track}.png")
             candidate_npy = os.path.join(folder, f"{track}_waypoints.npy")
             if os.path.exists(candidate_png) and os.path.exists(candidate_npy):
@@ -98,6 +210,9 @@ class LineFollowerEnv(gym.Env):
 
         # Then look in package tracks
         if png_path is None or npy_path is None:
+            with resources.path("line_follower_v0.tracks", f"{track}{BUNDLE_SUFFIX}") as p:
+                if os.path.exists(p):
+                    return p, None
             try:
                 with resources.path("line_follower_v0.tracks", f"{track}.png") as p:
                     png_path = p
@@ -107,36 +222,78 @@ class LineFollowerEnv(gym.Env):
                 raise FileNotFoundError(
                     f"Track '{track}' not found in user folders or default package tracks."
                 )
+        return png_path, npy_path
 
-        self.track_image = (1 - rgb2gray(image.imread(png_path))).astype(bool)
-        self.waypoints = np.load(npy_path)[::10]
-        self.pygame_track = pygame.image.load(png_path)#.convert_alpha()
-        # reverse the waypoints with 50% probability
-        
-        if random.choice([True, False]) if self.invert_waypoints is None else self.invert_waypoints:
+    def load_track(self, track: str):
+        # reverse the waypoints with 50% probability (drawn from the env seed, so episodes replay exactly)
+        invert_waypoints = bool(self.np_random.integers(2)) if self.invert_waypoints is None else self.invert_waypoints
+        invert_colours = bool(self.np_random.integers(2)) if self.invert_colours is None else self.invert_colours
+
+        spec = procedural_spec(track)
+        if spec is not None:
+            # generated in memory, memoized by seed
+            if spec.get("seed") is None:
+                spec["seed"] = int(self.np_random.integers(2**31))
+            self._track = procedural_track(invert_colours=invert_colours, packed=self.packed_track, **spec)
+        else:
+            # decoded once per process (or once per machine with a track store)
+            png_path, npy_path = self.find_track(track)
+            tracks = self.track_store or self.track_cache
+            self._track = tracks.get(track, png_path, npy_path, invert_colours, self.packed_track)
+        self._use_track(self._track, invert_waypoints)
+
+    def _use_track(self, track, reversed):
+        self._track = track
+        self.track_image = track.image
+        self.waypoints = track.waypoints
+        self.reversed = reversed
+        if reversed:
             self.waypoints = self.waypoints[::-1]
-        #     if self.verbose: print("counter-clockwise")
-        # else:
-        #     if self.verbose: print("clockwise")
-        if random.choice([True, False]) if self.invert_colours is None else self.invert_colours:
-            self.track_image = np.logical_not(self.track_image)
-
-            # invert pygame surface
-            arr = pygame.surfarray.array3d(self.pygame_track)
-            arr = 255 - arr
-            self.pygame_track = pygame.surfarray.make_surface(arr)#.convert_alpha()
 
+    def centerline(self):
+        """Signed distance (pixels, + is right of travel) to the centerline and lap progress in [0, 1)."""
+        if self.lean:
+            position = self.car.position
+            distance, progress = self._track.lookup_point(float(position[0]), HEIGHT - float(position[1]))
+        else:
+            distance, progress = self._track.lookup(to_pygame(self.car.position))
+        if self.reversed:
+            return -float(distance), float(1 - progress) % 1
+        return float(distance), float(progress)
+
+    @property
+    def pygame_track(self):
+        return self._track.surface
 
     def _get_obs(self):
     #     return {"agent": self._agent_location, "target": self._target_location}
-        return self.car.get_state(self.track_image).flatten()  # TODO: no need to flatten I guess
-
-    # def _get_info(self):
-    #     return {
-    #         "distance": np.linalg.norm(
-    #             self._agent_location - self._target_location, ord=1
-    #         )
-    #     }
+        if self.lean:
+            observation = self.car.get_state(self.track_image, out=self._obs)
+            # without `copy_obs` the same buffer is returned (and overwritten) every step
+            return observation.copy() if self.copy_obs else observation
+        if self.obs_mode == "pixels":
+            coins = self.waypoints[self.car_coins.upcoming(max(len(self.waypoints) // 10, 1))]
+            return self.rasterizer.render(
+                self.track_image, to_pygame(self.car.position), self.car.angle, coins[None]
+            )[0]
+        vals = self.car.get_state(self.track_image).flatten()  # TODO: no need to flatten I guess
+        if self.obs_mode == "packed":
+            return pack_obs(vals, self.observation_space.dtype)
+        return vals
+
+    def _get_info(self):
+        # cheap progress signals: coins collected this episode, completed laps
+        # and the car's position relative to the centerline
+        distance, progress = self.centerline()
+        return {
+            "cursor": self.car_coins.cursor,
+            "laps": self.car_coins.laps,
+            "distance": distance,
+            "progress": progress,
+        }
+
+    def _off_track(self, info):
+        return self.max_distance is not None and abs(info["distance"]) > self.max_distance
 
     def reset(self, seed=None, options=None):
         # We need the following line to seed self.np_random
@@ -153,27 +310,73 @@ class LineFollowerEnv(gym.Env):
         angle = np.arctan2(-vec[1], vec[0])
         # print(this_pos, angle*180/np.pi)
         
+        self._place_car(to_pygame(this_pos), angle, (loc_idx + 2) % len(self.waypoints))
+        
+        observation = self._get_obs()
+
+        if self.render_mode == "human":
+            self._render_frame(observation)
+        if self.viewer is not None:
+            self._publish(observation)
+
+        # return observation, None
+        return observation, self._get_info()
+
+    def _place_car(self, position, angle, start):
         self.car = Car(
             sensor_grid=self.sensor_grid,
-            position=to_pygame(this_pos),
+            position=position,
             angle=angle,
             x_spacing=self.x_spacing,
             y_spacing=self.y_spacing,
+            sensor_table=self.sensor_table,
+            integrator=self.integrator,
+            substeps=self.substeps,
+            lean=self.lean,
         )
 
         self.car_coins = Coins(
-            coins=np.roll(self.waypoints, -((loc_idx + 2) % len(self.waypoints)), axis=0),
+            coins=self.waypoints,
             car=self.car,
             radius=self.hitbox,
+            start=start,
+            lean=self.lean,
         )
-        
-        observation = self._get_obs()
 
-        if self.render_mode == "human":
-            self._render_frame(observation)
+    def get_state(self):
+        """Snapshot of the simulation, to branch from it later with `set_state`.
 
-        # return observation, None
-        return observation, {}
+        Much cheaper than `copy.deepcopy(env)`: an `EnvState` of a few numbers
+        plus references to the read-only track, which every snapshot shares.
+        The RNG state is copied, so a snapshot never changes once taken.
+        """
+        assert self.curr_step is not None, "Call reset before using get_state method."
+        return EnvState(
+            track=self._track,
+            reversed=bool(self.reversed),
+            position=tuple(float(x) for x in self.car.position),
+            angle=float(self.car.angle),
+            start=int(self.car_coins.start),
+            cursor=int(self.car_coins.cursor),
+            curr_step=int(self.curr_step),
+            rng=copy.deepcopy(self.np_random.bit_generator.state),
+        )
+
+    def set_state(self, state):
+        """Continue from a `get_state` snapshot, of this env or of another with the same settings.
+
+        Returns:
+            The observation in the restored state.
+        """
+        self._use_track(state.track, state.reversed)
+        self._place_car(np.array(state.position), state.angle, state.start)
+        self.car_coins.cursor = state.cursor
+        self.curr_step = state.curr_step
+        self.np_random.bit_generator.state = state.rng
+        observation = self._get_obs()
+        if self.viewer is not None:
+            self._publish(observation)
+        return observation
 
     # def step(self, action):
     #     # Map the action (element of {0,1,2,3}) to the direction we walk in
@@ -193,24 +396,63 @@ class LineFollowerEnv(gym.Env):
 
     #     return observation, reward, terminated, False, info
 
+    def _action_to_speeds(self, action):
+        if self.lean:
+            return self._speeds[action]
+        return action_to_inputs[action]
+
     def step(self, action):
-        dt = 0.05  # time step
-        left_speed, right_speed = action_to_inputs[action]
-        self.car.move(left_speed, right_speed, dt)
+        left_speed, right_speed = self._action_to_speeds(action)
+        reward = 0
+        for _ in range(self.frame_skip):
+            self.car.move(left_speed, right_speed, self.dt)
+            reward += self.car_coins.get_reward()  # every tick, so no coin is skipped
         observation =  self._get_obs()
-        reward =  self.car_coins.get_reward()
 
-        self.curr_step += 1
+        self.curr_step += self.frame_skip if self.step_unit == "tick" else 1
+        info = self._get_info()
 
         if self.render_mode == "human":
             self._render_frame(observation)
+        if self.viewer is not None:
+            self._publish(observation)
 
         return (
             observation,
             reward,
-            False,
+            self._off_track(info),
             self.curr_step > self.max_steps,
-            {}
+            info
+        )
+
+    def attach_viewer(self, fps=None):
+        """Watch the env live in a window drawn by a background thread.
+
+        Unlike `render_mode="human"` this never slows `step()` down: each step just
+        publishes the car and coin state, and the viewer shows the latest one at
+        `fps` (defaults to `metadata["render_fps"]`). Can be called at any time
+        with render_mode None or "rgb_array"; "human" already has the window.
+        """
+        assert self.render_mode != "human", "attach_viewer needs render_mode None or 'rgb_array', 'human' owns the window"
+        from .viewer import Viewer  # imports pygame
+        self.detach_viewer()
+        self.viewer = Viewer(fps or self.metadata["render_fps"], size=(WIDTH, HEIGHT)).start()
+        if self.curr_step is not None:
+            self._publish()
+        return self.viewer
+
+    def detach_viewer(self):
+        if self.viewer is not None:
+            self.viewer.close()
+            self.viewer = None
+
+    def _publish(self, sensor_vals=None):
+        if sensor_vals is None or self.obs_mode != "binary":
+            sensor_vals = self.car.get_state(self.track_image)
+        self.viewer.publish(
+            self._track, self.car.position, self.car.angle,
+            self.waypoints, self.car_coins.start, self.car_coins.cursor, self.hitbox,
+            vals=sensor_vals, sensor_grid=self.sensor_grid, x_spacing=self.x_spacing, y_spacing=self.y_spacing,
         )
 
     def render(self):
@@ -218,7 +460,24 @@ class LineFollowerEnv(gym.Env):
             return self._render_frame()
         # else return None
 
-    def _render_frame(self, sensor_vals=None):  # never gets called if render_mode is None
+    def render_raw(self, out=None):
+        """Draw the frame like `render()`, but return the canvas's packed 0xRRGGBB pixels.
+
+        Only a plain copy of (height, width) uint32 words into `out` (allocated
+        if None), several times cheaper than `render()`'s conversion to RGB,
+        which `xrgb_to_rgb` does later (e.g. in another thread). "rgb_array" only.
+        """
+        assert self.render_mode == "rgb_array"
+        self._render_frame(raw=True)
+        if out is None:
+            out = np.empty((HEIGHT, WIDTH), dtype=np.uint32)
+        view = self.canvas.get_view("2")  # (width, height) words, rows contiguous; locks the canvas
+        np.copyto(out, np.asarray(view).T, casting="no")
+        del view
+        return out
+
+    def _render_frame(self, sensor_vals=None, raw=False):  # never gets called if render_mode is None
+        import pygame
         if self.window is None and self.render_mode == "human":
             pygame.init()
             pygame.display.init()
@@ -226,31 +485,52 @@ class LineFollowerEnv(gym.Env):
         if self.clock is None and self.render_mode == "human":
             self.clock = pygame.time.Clock()
 
-        canvas = pygame.Surface((WIDTH, HEIGHT))
-        canvas.fill(WHITE)
-        canvas.blit(self.pygame_track, (0, 0))
-
-        vals = sensor_vals if sensor_vals is not None else self._get_obs()
+        # the canvas persists between frames: only the areas drawn on last frame
+        # are restored from the static background before drawing the new frame
+        background = self._track.background
+        if self.canvas is None:
+            self.canvas = pygame.Surface((WIDTH, HEIGHT), 0, 32, XRGB)
+        if self._canvas_background is not background:  # new track or inversion
+            self.canvas.fill(WHITE)
+            self.canvas.blit(background, (0, 0))
+            self._canvas_background = background
+            self._dirty = [self.canvas.get_rect()]
+        else:
+            for rect in self._dirty:
+                self.canvas.blit(background, rect, rect)
+
+        if sensor_vals is None or self.obs_mode != "binary":
+            sensor_vals = self.car.get_state(self.track_image)
+        vals = sensor_vals
         
-        self.car_coins.display(canvas)
-        self.car.display(canvas, vals=vals)
+        drawn = self.car_coins.display(self.canvas)
+        drawn += self.car.display(self.canvas, vals=vals)
+        changed = self._dirty + drawn
+        self._dirty = drawn
 
         if self.render_mode == "human":
-            # The following line copies our drawings from `canvas` to the visible window
-            self.window.blit(canvas, canvas.get_rect())
+            # The following lines copy only the changed areas of `canvas` to the visible window
+            for rect in changed:
+                self.window.blit(self.canvas, rect, rect)
             pygame.event.pump()
-            pygame.display.update()
+            pygame.display.update(changed)
 
             # We need to ensure that human-rendering occurs at the predefined framerate.
             # The following line will automatically add a delay to
             # keep the framerate stable.
             self.clock.tick(self.metadata["render_fps"])
-        else:  # rgb_array
-            return np.transpose(
-                np.array(pygame.surfarray.pixels3d(canvas)), axes=(1, 0, 2)
-            )
+        elif not raw:  # rgb_array
+            if self._frame is None:
+                self._frame = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+            # SDL writes the RGB bytes row by row, much faster than copying the transposed `pixels3d`
+            rgb = np.frombuffer(pygame.image.tobytes(self.canvas, "RGB"), dtype=np.uint8)
+            np.copyto(self._frame, rgb.reshape(HEIGHT, WIDTH, 3))
+            # without `copy_frames` the same buffer is returned (and overwritten) every frame
+            return self._frame.copy() if self.copy_frames else self._frame
 
     def close(self):
+        self.detach_viewer()
         if self.window is not None:
+            import pygame
             pygame.display.quit()
             pygame.quit()
@@ -0,0 +1,247 @@
+import gymnasium as gym
+import numpy as np
+from gymnasium.envs.registration import load_env_creator
+from gymnasium.utils import seeding
+
+from .car import Car, rotate_points
+from .main import HEIGHT
+
+COLLISIONS = ("block", "terminate", "ignore")
+
+# neighbouring grid cells that can hold a car touching one in cell (0, 0); the
+# other four are covered from the other side, so every pair is found once
+_HALF_NEIGHBOURHOOD = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def car_corners(template, position, angle):
+    """Batched `Car.get_car` corners: `template` (4, 2) from `Car.corners`, shape (n, 4, 2)."""
+    return rotate_points(template, angle) + position[:, None]
+
+
+def candidate_pairs(centres, cell_size):
+    """Pairs (i, j), i != j, of points at most `cell_size` apart per axis, from a uniform-grid spatial hash.
+
+    Points are bucketed by grid cell and each is only compared with the points
+    of its own and neighbouring cells, so the cost is linear in the number of
+    points plus the number of close pairs. Each pair is returned once.
+
+    Returns:
+        (np.array, np.array): Indices of the first and second point of each pair.
+    """
+    cells = np.floor(centres / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0) - 1  # neighbours of every cell are >= 0
+    stride = int(cells[:, 1].max()) + 2
+    key = cells[:, 0] * stride + cells[:, 1]
+    order = np.argsort(key, kind="stable")
+    sorted_keys = key[order]
+
+    first, second = [], []
+    for dx, dy in _HALF_NEIGHBOURHOOD:
+        neighbour = (cells[:, 0] + dx) * stride + cells[:, 1] + dy
+        lo = np.searchsorted(sorted_keys, neighbour, side="left")
+        counts = np.searchsorted(sorted_keys, neighbour, side="right") - lo
+        i = np.repeat(np.arange(len(centres)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(lo, counts) + offsets]
+        if (dx, dy) == (0, 0):
+            keep = i < j  # same cell: each pair once, no self pairs
+            i, j = i[keep], j[keep]
+        first.append(i)
+        second.append(j)
+    return np.concatenate(first), np.concatenate(second)
+
+
+def polygons_overlap(a, b):
+    """Separating axis test for pairs of convex quadrilaterals `a`, `b` of shape (m, 4, 2)."""
+    edges = np.concatenate((np.roll(a, -1, axis=1) - a, np.roll(b, -1, axis=1) - b), axis=1)
+    axes = np.stack((-edges[..., 1], edges[..., 0]), axis=-1)  # (m, 8, 2) edge normals
+    pa = np.einsum("mkd,mpd->mkp", axes, a)
+    pb = np.einsum("mkd,mpd->mkp", axes, b)
+    separated = (pa.max(axis=2) < pb.min(axis=2)) | (pb.max(axis=2) < pa.min(axis=2))
+    return ~separated.any(axis=1)
+
+
+def contacts(corners, active=None):
+    """Pairs of touching cars, from their corners (n, 4, 2).
+
+    Broad phase: a spatial hash with cells the size of a car's diagonal, so only
+    cars in neighbouring cells are compared. Narrow phase: the exact polygon test.
+    Cars with `active` False are ignored.
+
+    Returns:
+        (np.array, np.array): Indices (i < j or i > j) of the cars in contact, one entry per pair.
+    """
+    index = np.arange(len(corners)) if active is None else np.flatnonzero(active)
+    if len(index) < 2:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+    corners = corners[index]
+    centres = corners.mean(axis=1)
+    diagonal = np.linalg.norm(corners[0, 2] - corners[0, 0])
+    i, j = candidate_pairs(centres, diagonal)
+    close = np.linalg.norm(centres[i] - centres[j], axis=1) < diagonal  # bounding circles
+    i, j = i[close], j[close]
+    hit = polygons_overlap(corners[i], corners[j])
+    return index[i[hit]], index[j[hit]]
+
+
+class LineFollowerMultiEnv:
+    """Several cars racing on one track, with a PettingZoo-style parallel API.
+
+    All cars share one track mask and waypoint set, drive in the same
+    direction and are moved, sensed and rewarded together by an internal
+    `LineFollowerVectorEnv` (one sub-env per car, no autoreset). Cars start
+    one behind the other and each collects its own coins in order. Contacts
+    between car bodies (the `Car.get_car` corners) are found with a spatial
+    hash, see `contacts`, and handled by `collision`:
+    - "block": touching cars undo that tick's move;
+    - "terminate": their episodes end;
+    - "ignore": only reported.
+
+    `reset` and `step` take and return dicts keyed by agent ("car_0", ...).
+    Agents whose episode terminated leave `agents` and the track; the episode
+    is truncated for everyone after `max_steps`.
+
+    Args:
+        num_cars (int, optional): Number of cars. Defaults to 2.
+        collision (str, optional): See above. Defaults to "block".
+        collision_penalty (float, optional): Subtracted from the reward of a car for
+            every tick it touches another. Defaults to 0.
+        gap (float, optional): Distance between consecutive cars at the start, in car
+            lengths. Defaults to 1.5.
+        env_id (str, optional): Registered line follower (v0 or v1) whose vector env
+            simulates the cars. Defaults to v0.
+        **kwargs: Arguments of `LineFollowerVectorEnv`. Procedural tracks need a seed.
+    """
+    metadata = {"render_modes": [], "name": "line_follower_multi_v0"}
+
+    def __init__(self, num_cars=2, collision="block", collision_penalty=0.0, gap=1.5, env_id="my_gym_envs/line_follower_v0", **kwargs):
+        assert collision in COLLISIONS
+        self.collision = collision
+        self.collision_penalty = collision_penalty
+        self.gap = gap
+        self.sim = load_env_creator(gym.spec(env_id).vector_entry_point)(num_envs=num_cars, **kwargs)
+        self.render_mode = None
+        self.possible_agents = [f"car_{i}" for i in range(num_cars)]
+        self.agent_name_mapping = {agent: i for i, agent in enumerate(self.possible_agents)}
+        self.agents = []
+        self.corners = Car(self.sim.sensor_grid, x_spacing=self.sim.x_spacing, y_spacing=self.sim.y_spacing).corners
+        self.length = self.sim.sensor_grid[1] * self.sim.x_spacing
+        self.active = np.zeros(num_cars, dtype=bool)
+        self._seed(None)
+
+    def _seed(self, seed):
+        self.np_random, _ = seeding.np_random(seed)
+
+    def observation_space(self, agent):
+        return self.sim.single_observation_space
+
+    def action_space(self, agent):
+        return self.sim.single_action_space
+
+    @property
+    def num_agents(self):
+        return len(self.agents)
+
+    @property
+    def max_num_agents(self):
+        return len(self.possible_agents)
+
+    def _place_cars(self):
+        """Line the cars up one behind the other, all in the same direction and colours."""
+        sim = self.sim
+        n = len(self.possible_agents)
+        reversed = bool(self.np_random.integers(2)) if sim.invert_waypoints is None else bool(sim.invert_waypoints)
+        inverted = bool(self.np_random.integers(2)) if sim.invert_colours is None else bool(sim.invert_colours)
+        waypoints = sim.waypoints[int(reversed)]
+        n_wp = len(waypoints)
+        spacing = np.linalg.norm(np.diff(waypoints, axis=0), axis=1).mean()
+        # as far apart as asked, or evenly around the track if there is no room for that
+        step = min(max(int(np.ceil(self.gap * self.length / spacing)), 1), max(n_wp // n, 1))
+        lead = self.np_random.integers(0, n_wp - 1)
+        idx = (lead - step * np.arange(n)) % n_wp
+        this_pos = waypoints[idx]
+        vec = waypoints[(idx + 1) % n_wp] - this_pos
+
+        sim.reversed[:] = reversed
+        sim.inverted[:] = inverted
+        sim.position[:] = this_pos
+        sim.position[:, 1] = HEIGHT - this_pos[:, 1]  # to_pygame
+        sim.angle[:] = np.arctan2(-vec[:, 1], vec[:, 0])
+        sim.start[:] = (idx + 2) % n_wp
+        sim.cursor[:] = 0
+        sim.curr_step[:] = 0
+
+    def _infos(self, info, touching):
+        return {
+            agent: {
+                **{key: value[i] for key, value in info.items()},
+                "contacts": [self.possible_agents[j] for j in touching.get(i, ())],
+            }
+            for agent, i in self.agent_name_mapping.items() if agent in self.agents
+        }
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self._seed(seed)
+        self.sim.reset(seed=int(self.np_random.integers(2**31)))  # allocates the car arrays
+        self._place_cars()
+        self.agents = list(self.possible_agents)
+        self.active[:] = True
+        observation = self.sim._get_obs()
+        observations = {agent: observation[i] for agent, i in self.agent_name_mapping.items()}
+        return observations, self._infos(self.sim._get_info(), {})
+
+    def step(self, actions):
+        sim = self.sim
+        n = len(self.possible_agents)
+        batch = np.zeros((n, *sim.single_action_space.shape), dtype=sim.single_action_space.dtype)
+        for agent, action in actions.items():
+            batch[self.agent_name_mapping[agent]] = action
+        speeds = sim._action_to_speeds(batch) * self.active[:, None]  # cars off the track stand still
+
+        reward = np.zeros(n, dtype=np.float64)
+        collided = np.zeros(n, dtype=bool)
+        touching = {}
+        for _ in range(sim.frame_skip):
+            position, angle = sim.position, sim.angle
+            sim._move(speeds, sim.dt)
+            i, j = contacts(car_corners(self.corners, sim.position, sim.angle), self.active)
+            hit = np.zeros(n, dtype=bool)
+            hit[i] = hit[j] = True
+            if self.collision == "block" and hit.any():
+                sim.position[hit] = position[hit]
+                sim.angle[hit] = angle[hit]
+            for a, b in zip(i.tolist(), j.tolist()):
+                touching.setdefault(a, set()).add(b)
+                touching.setdefault(b, set()).add(a)
+            collided |= hit
+            reward += sim._get_reward() - self.collision_penalty * hit
+        sim.curr_step += sim.frame_skip if sim.step_unit == "tick" else 1
+
+        observation = sim._get_obs()
+        info = sim._get_info()
+        terminated = np.zeros(n, dtype=bool)
+        if sim.max_distance is not None:
+            terminated |= np.abs(info["distance"]) > sim.max_distance
+        if self.collision == "terminate":
+            terminated |= collided
+        truncated = sim.curr_step > sim.max_steps
+
+        agents = self.agents
+        observations = {agent: observation[self.agent_name_mapping[agent]] for agent in agents}
+        rewards = {agent: float(reward[self.agent_name_mapping[agent]]) for agent in agents}
+        terminations = {agent: bool(terminated[self.agent_name_mapping[agent]]) for agent in agents}
+        truncations = {agent: bool(truncated[self.agent_name_mapping[agent]]) for agent in agents}
+        infos = self._infos(info, {i: sorted(others) for i, others in touching.items()})
+
+        self.agents = [agent for agent in agents if not (terminations[agent] or truncations[agent])]
+        self.active[:] = False
+        self.active[[self.agent_name_mapping[agent] for agent in self.agents]] = True
+        return observations, rewards, terminations, truncations, infos
+
+    def render(self):
+        gym.logger.warn("LineFollowerMultiEnv does not render.")
+
+    def close(self):
+        self.sim.close()
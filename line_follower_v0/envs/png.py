@@ -0,0 +1,92 @@
+import struct
+import zlib
+
+import numpy as np
+
+_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_CHANNELS = {0: 1, 2: 3, 4: 2, 6: 4}  # colour type -> samples per pixel
+
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+    return np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+
+
+def _unfilter(raw, height, stride, bpp):
+    """Undo the per scanline PNG filters. Sub and Up are vectorized per row;
+    Average and Paeth (rare in the track images) go pixel by pixel."""
+    rows = np.frombuffer(raw, np.uint8).reshape(height, stride + 1)
+    filters, data = rows[:, 0], rows[:, 1:].astype(np.int32)
+    out = np.zeros((height + 1, stride), np.int32)  # out[0] is the zero row above the image
+    for r in range(height):
+        line, prior, f = data[r], out[r], filters[r]
+        if f == 0:
+            out[r + 1] = line
+        elif f == 1:
+            out[r + 1] = np.cumsum(line.reshape(-1, bpp), axis=0).reshape(-1) & 0xFF
+        elif f == 2:
+            out[r + 1] = (line + prior) & 0xFF
+        elif f in (3, 4):
+            recon = out[r + 1]
+            left = np.zeros(bpp, np.int32)
+            up_left = np.zeros(bpp, np.int32)
+            for i in range(0, stride, bpp):
+                up = prior[i:i + bpp]
+                pred = (left + up) >> 1 if f == 3 else _paeth(left, up, up_left)
+                left = recon[i:i + bpp] = (line[i:i + bpp] + pred) & 0xFF
+                up_left = up
+        else:
+            raise ValueError(f"bad PNG filter type {f}")
+    return out[1:].astype(np.uint8)
+
+
+def imread(path):
+    """Read a PNG as float32 in [0, 1], like `matplotlib.image.imread`, without matplotlib.
+
+    Handles the non-interlaced 8-bit greyscale / RGB / RGBA images the tracks
+    are made of; anything else is handed to matplotlib, imported only then.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:8] == _SIGNATURE:
+        width, height, depth, colour, _, _, interlace = struct.unpack(">IIBBBBB", data[16:29])
+        if depth == 8 and colour in _CHANNELS and interlace == 0:
+            chunks, i = [], 8
+            while i < len(data):
+                length, kind = struct.unpack(">I4s", data[i:i + 8])
+                if kind == b"IDAT":
+                    chunks.append(data[i + 8:i + 8 + length])
+                elif kind == b"IEND":
+                    break
+                i += 12 + length
+            channels = _CHANNELS[colour]
+            pixels = _unfilter(zlib.decompress(b"".join(chunks)), height, width * channels, channels)
+            pixels = pixels.reshape(height, width, channels)
+            if channels == 1:
+                pixels = pixels[..., 0]
+            return pixels.astype(np.float32) / 255
+
+    from matplotlib import image
+    return image.imread(path)
+
+
+def _chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def imwrite(path, rgb, level=1):
+    """Write a uint8 RGB image (height, width, 3) as a PNG, with zlib only.
+
+    No filtering and a fast compression `level` by default: the track frames are
+    mostly flat colour, which compresses well without either.
+    """
+    rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+    height, width = rgb.shape[:2]
+    rows = np.zeros((height, 1 + width * 3), dtype=np.uint8)  # filter type 0 at the start of each row
+    rows[:, 1:] = rgb.reshape(height, -1)
+    with open(path, "wb") as f:
+        f.write(_SIGNATURE)
+        f.write(_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(_chunk(b"IDAT", zlib.compress(rows.tobytes(), level)))
+        f.write(_chunk(b"IEND", b""))
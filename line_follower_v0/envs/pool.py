@@ -0,0 +1,252 @@
+import multiprocessing as mp
+import os
+
+import gymnasium as gym
+import numpy as np
+from gymnasium.envs.registration import load_env_creator
+from gymnasium.vector import VectorEnv, AutoresetMode
+
+STEP, RESET, CLOSE = 1, 2, 3
+NO_SEED = -1
+
+
+def _views(buffers, lo=0, hi=None):
+    """NumPy views of the shared buffers, rows `lo:hi`."""
+    return {name: np.frombuffer(raw, dtype).reshape(-1, *shape)[lo:hi] for name, (raw, dtype, shape) in buffers.items()}
+
+
+def _write(views, obs, reward, terminated, truncated, info):
+    views["obs"][:] = obs
+    views["reward"][:] = reward
+    views["terminated"][:] = terminated
+    views["truncated"][:] = truncated
+    for key, value in info.items():
+        if f"info.{key}" in views:
+            views[f"info.{key}"][:] = value
+
+
+def _worker(entry_point, kwargs, lo, hi, buffers, command, seeds, index, go, done, cpus, restart_seed):
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+    env = load_env_creator(entry_point)(num_envs=hi - lo, **kwargs)
+    views = _views(buffers, lo, hi)
+    if restart_seed is not None:
+        # stands in for the crashed worker: its episodes end truncated on the last observation
+        # written, and the next step starts new ones (next-step autoreset)
+        views["reward"][:] = 0
+        views["terminated"][:] = False
+        views["truncated"][:] = True
+    done.release()  # ready
+
+    actions = views["action"]
+    while True:
+        go.acquire()
+        if command.value == STEP and restart_seed is not None:
+            obs, info = env.reset(seed=restart_seed)
+            restart_seed = None
+            _write(views, obs, 0, False, False, info)
+        elif command.value == STEP:
+            _write(views, *env.step(actions))
+        elif command.value == RESET:
+            restart_seed = None
+            seed = int(seeds[index])
+            obs, info = env.reset(seed=None if seed == NO_SEED else seed)
+            _write(views, obs, 0, False, False, info)
+        else:  # CLOSE
+            env.close()
+            done.release()
+            break
+        done.release()
+
+
+class LineFollowerPoolEnv(VectorEnv):
+    """A `LineFollowerVectorEnv` split into shards, each stepped by its own worker process.
+
+    Unlike `AsyncVectorEnv` nothing is pickled per step: actions, observations,
+    rewards, done flags and the array entries of `info` live in shared memory.
+    A step writes the action batch, wakes every worker with a semaphore (a futex
+    on Linux), and waits for each to post back; the workers step their shard of
+    cars in place, all in parallel.
+
+    A worker that dies is restarted, and its sub-envs are reported truncated
+    with the last observation written before the crash; they start over on the
+    next step, as after any truncation. `restarts` counts the restarts per worker.
+
+    Args:
+        num_envs (int): Total number of cars.
+        num_workers (int, optional): Worker processes, with shards as even as possible.
+            Defaults to the number of usable CPUs (at most `num_envs`).
+        shard_sizes (list[int], optional): Cars per worker instead, summing to `num_envs`.
+        cpus (optional): CPU pinning. True pins worker i to the i-th usable CPU (round robin),
+            a list gives each worker a CPU id or a set of them. Defaults to no pinning.
+        env_id (str, optional): Registered line follower (v0 or v1). Defaults to v0.
+        copy (bool, optional): Return copies of the shared buffers instead of views that the
+            next `step()` overwrites. Defaults to True.
+        timeout (float, optional): Seconds before a worker that does not answer is considered
+            hung, killed and restarted. Defaults to None (wait while it is alive).
+        max_restarts (int, optional): Restarts per worker before giving up with a
+            RuntimeError. Defaults to 3.
+        context (str, optional): multiprocessing start method. Defaults to the platform's.
+        **kwargs: Arguments of `LineFollowerVectorEnv` (with `track_store=True` the
+            workers share one copy of the track).
+    """
+    metadata = {"render_modes": [], "autoreset_mode": AutoresetMode.NEXT_STEP}
+
+    def __init__(
+        self, num_envs=1,
+        num_workers=None,
+        shard_sizes=None,
+        cpus=None,
+        env_id="my_gym_envs/line_follower_v0",
+        copy=True,
+        timeout=None,
+        max_restarts=3,
+        context=None,
+        **kwargs,
+    ):
+        usable = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+        if shard_sizes is None:
+            num_workers = min(num_workers or len(usable), num_envs)
+            shard_sizes = [len(a) for a in np.array_split(np.arange(num_envs), num_workers)]
+        assert sum(shard_sizes) == num_envs and min(shard_sizes) > 0, "shard_sizes must be positive and sum to num_envs"
+        if cpus is True:
+            cpus = [usable[i % len(usable)] for i in range(len(shard_sizes))]
+        if cpus is not None:
+            assert len(cpus) == len(shard_sizes), "one CPU (or set of CPUs) per worker"
+            cpus = [{c} if isinstance(c, int) else set(c) for c in cpus]
+
+        self.num_envs = num_envs
+        self.shard_sizes = list(shard_sizes)
+        self.num_workers = len(shard_sizes)
+        self.bounds = np.concatenate(([0], np.cumsum(shard_sizes)))
+        self.cpus = cpus
+        self.env_id = env_id
+        self.copy = copy
+        self.timeout = timeout
+        self.max_restarts = max_restarts
+        self.kwargs = kwargs
+        self.render_mode = None
+        self.entry_point = gym.spec(env_id).vector_entry_point
+
+        # a one-car env in this process tells the spaces and the dtypes of everything shared
+        probe = load_env_creator(self.entry_point)(num_envs=1, **kwargs)
+        self.single_observation_space = probe.single_observation_space
+        self.single_action_space = probe.single_action_space
+        self.observation_space = gym.vector.utils.batch_space(self.single_observation_space, num_envs)
+        self.action_space = gym.vector.utils.batch_space(self.single_action_space, num_envs)
+        obs, _ = probe.reset(seed=0)  # the dtype the env returns, not the space's (bool for int8 MultiBinary)
+        _, reward, _, _, info = probe.step(probe.action_space.sample())
+        probe.close()
+
+        self._ctx = mp.get_context(context)
+        layout = {
+            "action": (self.action_space.dtype, self.single_action_space.shape),
+            "obs": (obs.dtype, obs.shape[1:]),
+            "reward": (reward.dtype, ()),
+            "terminated": (np.dtype(bool), ()),
+            "truncated": (np.dtype(bool), ()),
+        }
+        for key, value in info.items():
+            if isinstance(value, np.ndarray) and not key.startswith("_"):
+                layout[f"info.{key}"] = (value.dtype, value.shape[1:])
+        self._buffers = {
+            name: (self._ctx.RawArray("b", num_envs * max(int(np.prod(shape)), 1) * np.dtype(dtype).itemsize), np.dtype(dtype), shape)
+            for name, (dtype, shape) in layout.items()
+        }
+        self._views = _views(self._buffers)
+        self._command = self._ctx.RawValue("i", 0)
+        self._seeds = self._ctx.RawArray("q", self.num_workers)
+
+        self.restarts = [0] * self.num_workers
+        self._processes = [None] * self.num_workers
+        self._go = [None] * self.num_workers
+        self._done = [None] * self.num_workers
+        self.closed = False
+        for w in range(self.num_workers):
+            self._start(w)
+        for w in range(self.num_workers):
+            self._wait(w, starting=True)
+        self._started = False
+
+    def _start(self, w, restart_seed=None):
+        # fresh semaphores, so a crashed worker's leftover posts can't be mistaken for answers
+        self._go[w], self._done[w] = self._ctx.Semaphore(0), self._ctx.Semaphore(0)
+        lo, hi = self.bounds[w], self.bounds[w + 1]
+        process = self._ctx.Process(
+            target=_worker, name=f"line-follower-pool-{w}", daemon=True,
+            args=(self.entry_point, self.kwargs, lo, hi, self._buffers, self._command, self._seeds, w,
+                  self._go[w], self._done[w], None if self.cpus is None else self.cpus[w], restart_seed),
+        )
+        process.start()
+        self._processes[w] = process
+
+    def _wait(self, w, starting=False):
+        """Wait for worker `w` to post back; restart it if it died or hung. True if it was restarted."""
+        waited = 0.0
+        while not self._done[w].acquire(timeout=0.1):
+            waited += 0.1
+            process = self._processes[w]
+            hung = self.timeout is not None and waited >= self.timeout
+            if process.is_alive() and not hung:
+                continue
+            if starting and not self.restarts[w]:
+                process.kill()
+                raise RuntimeError(f"Worker {w} failed to start (exit code {process.exitcode}).")
+            self._restart(w)
+            return True
+        return False
+
+    def _restart(self, w):
+        if self.restarts[w] >= self.max_restarts:
+            raise RuntimeError(f"Worker {w} crashed {self.restarts[w] + 1} times, giving up.")
+        self._processes[w].kill()
+        self._processes[w].join()
+        self.restarts[w] += 1
+        self._start(w, restart_seed=int(self.np_random.integers(2**62)))
+        self._wait(w, starting=True)
+
+    def _run(self, command):
+        self._command.value = command
+        for go in self._go:
+            go.release()
+        for w in range(self.num_workers):
+            if self._wait(w) and command == RESET:
+                # a plain reset instead of the truncated restart
+                self._go[w].release()
+                self._wait(w)
+
+    def _result(self, name):
+        view = self._views[name]
+        return view.copy() if self.copy else view
+
+    def _info(self):
+        return {name[5:]: self._result(name) for name in self._views if name.startswith("info.")}
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        if seed is None:
+            seeds = [NO_SEED] * self.num_workers
+        elif isinstance(seed, int):
+            seeds = [seed + w for w in range(self.num_workers)]
+        else:
+            assert len(seed) == self.num_workers, "one seed per worker"
+            seeds = [NO_SEED if s is None else s for s in seed]
+        self._seeds[:] = seeds
+        self._run(RESET)
+        self._started = True
+        return self._result("obs"), self._info()
+
+    def step(self, actions):
+        assert self._started, "Call reset before using step method."
+        self._views["action"][:] = actions
+        self._run(STEP)
+        return self._result("obs"), self._result("reward"), self._result("terminated"), self._result("truncated"), self._info()
+
+    def close_extras(self, **kwargs):
+        self._command.value = CLOSE
+        for go in self._go:
+            go.release()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
@@ -0,0 +1,122 @@
+from functools import lru_cache
+
+import numpy as np
+
+from .track import PackedMask, Track
+
+PREFIX = "random"
+
+
+def _catmull_rom(points, samples=64):
+    """Closed uniform Catmull-Rom spline through `points` (K, 2), `samples` points per segment."""
+    p0, p1, p2, p3 = (np.roll(points, -k, axis=0)[:, None] for k in (-1, 0, 1, 2))
+    t = np.linspace(0, 1, samples, endpoint=False)[None, :, None]
+    curve = 0.5 * (
+        2*p1 + (p2 - p0)*t + (2*p0 - 5*p1 + 4*p2 - p3)*t**2 + (3*p1 - p0 - 3*p2 + p3)*t**3
+    )
+    return curve.reshape(-1, 2)
+
+
+def _resample(curve, n):
+    """`n` points evenly spaced along the closed polyline `curve`."""
+    closed = np.concatenate((curve, curve[:1]))
+    arc = np.concatenate(([0], np.cumsum(np.linalg.norm(np.diff(closed, axis=0), axis=1))))
+    s = np.linspace(0, arc[-1], n, endpoint=False)
+    return np.stack((np.interp(s, arc, closed[:, 0]), np.interp(s, arc, closed[:, 1])), axis=-1)
+
+
+def rasterize_line(points, shape, width):
+    """Boolean mask of a closed polyline stroked `width` pixels wide.
+
+    Each segment only touches the pixels of its own bounding box, so this costs
+    about the area of the line rather than of the image.
+    """
+    h, w = shape
+    r = width / 2
+    mask = np.zeros(shape, dtype=bool)
+    for p, q in zip(points, np.roll(points, -1, axis=0)):
+        c0, r0 = np.maximum(np.floor(np.minimum(p, q) - r).astype(int), 0)
+        c1, r1 = np.minimum(np.ceil(np.maximum(p, q) + r).astype(int), (w, h))
+        if c0 >= c1 or r0 >= r1:
+            continue
+        x = np.arange(c0, c1) + 0.5 - p[0]
+        y = np.arange(r0, r1)[:, None] + 0.5 - p[1]
+        d = q - p
+        t = np.clip((x*d[0] + y*d[1]) / max(d @ d, 1e-12), 0, 1)
+        mask[r0:r1, c0:c1] |= (x - t*d[0])**2 + (y - t*d[1])**2 <= r*r
+    return mask
+
+
+def generate_layout(seed, shape=(500, 800), points=None, roughness=0.4, line_width=29, padding=75, n_waypoints=100):
+    """A random closed track: a smooth loop through jittered points around an ellipse.
+
+    Few points give rounded polygons (like the hexagon or rounded square), many
+    points with a high `roughness` give winding loops. Control points keep
+    their angular order, so the loop never crosses itself.
+
+    Args:
+        seed (int): Same seed, same layout.
+        shape (tuple, optional): (height, width) of the mask. Defaults to (500, 800), the env's size.
+        points (int, optional): Number of control points. Defaults to a random 4 to 9.
+        roughness (float, optional): Control point radii are drawn from [1 - roughness, 1]. Defaults to 0.4.
+        line_width (float, optional): Width of the line in pixels. Defaults to 29, as the package tracks.
+        padding (float, optional): Margin between the track and the image border. Defaults to 75.
+        n_waypoints (int, optional): Number of waypoints, evenly spaced. Defaults to 100.
+
+    Returns:
+        mask (np.array): Boolean (height, width), True on the line.
+        waypoints (np.array): (n_waypoints, 2) in pygame coordinates.
+    """
+    rng = np.random.default_rng(seed)
+    k = int(rng.integers(4, 10)) if points is None else points
+    angles = 2*np.pi * (np.arange(k) + rng.uniform(-0.3, 0.3, k)) / k + rng.uniform(0, 2*np.pi)
+    radii = rng.uniform(1 - roughness, 1, k)
+    control = np.stack((radii*np.cos(angles), radii*np.sin(angles)), axis=-1)
+
+    # stretch the loop to fill the image inside the padding
+    curve = _catmull_rom(control)
+    lo, hi = curve.min(axis=0), curve.max(axis=0)
+    h, w = shape
+    curve = padding + (curve - lo) / (hi - lo) * (w - 2*padding, h - 2*padding)
+
+    mask = rasterize_line(_resample(curve, 4 * n_waypoints), shape, line_width)
+    return mask, _resample(curve, n_waypoints)
+
+
+def procedural_spec(track):
+    """Generator arguments for a procedural `track=` spec, or None for a track name.
+
+    - "random": a new layout every `reset()`, seeded from the env's RNG.
+    - "random:<seed>": always the same layout.
+    - a dict of `generate_layout` arguments, with or without "seed".
+    """
+    if isinstance(track, dict):
+        # hashable, for the memo
+        return {k: tuple(v) if isinstance(v, list) else v for k, v in track.items()}
+    if isinstance(track, str) and track.split(":")[0] == PREFIX:
+        _, _, seed = track.partition(":")
+        return {"seed": int(seed) if seed else None}
+    return None
+
+
+# about 0.4 MB (the mask) per entry; centerline fields, 3.2 MB, are not kept here
+# but in the bounded `field_cache`, and only for layouts driven long enough to need them
+@lru_cache(maxsize=64)
+def procedural_track(seed, invert_colours=False, packed=False, **params):
+    """A generated `Track`, memoized by seed and arguments so revisiting a layout is free.
+
+    Lives only in memory: no PNG or waypoint file is written, and the display
+    image is drawn from the mask the first time it is rendered. Distance and
+    progress come from the waypoint polyline, see `Track.lookup`.
+    """
+    mask, waypoints = generate_layout(seed, **params)
+    if invert_colours:
+        mask = np.logical_not(mask)
+    if packed:
+        mask = PackedMask(mask)
+    else:
+        mask.flags.writeable = False
+    waypoints.flags.writeable = False
+    # both colour inversions share the fields
+    fields_key = (PREFIX, seed, tuple(sorted(params.items())), mask.shape)
+    return Track.from_arrays(f"{PREFIX}:{seed}", None, None, mask, waypoints, bool(invert_colours), fields_key=fields_key)
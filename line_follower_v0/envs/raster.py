@@ -0,0 +1,133 @@
+import numpy as np
+
+from .car import sense
+
+# (grayscale, rgb) of each layer
+BACKGROUND = (255, (255, 255, 255))
+LINE       = (  0, (  0,   0,   0))
+COIN       = (160, (255, 140,   0))
+CAR        = ( 80, (  0,   0, 255))
+
+
+class Rasterizer:
+    """Pygame-free pixel observations of a track, drawn with NumPy only.
+
+    Draws the track, the upcoming coins and (in the global view) the car for a
+    whole batch of car poses in one call, at a small configurable resolution.
+    Nothing here needs a display or SDL.
+
+    - "ego": a `view_size` pixel window of the track centred on the car and
+      rotated so the car always faces up.
+    - "global": the whole track scaled down to `shape`, with the car drawn on it.
+
+    Args:
+        shape (tuple, optional): (height, width) of the observation. Defaults to (64, 64).
+        view (str, optional): "ego" or "global". Defaults to "ego".
+        channels (int, optional): 1 for grayscale, 3 for RGB. Defaults to 1.
+        view_size (float, optional): Side of the ego window in track pixels. Defaults to 200.
+        track_shape (tuple, optional): (height, width) of the track image. Defaults to (500, 800).
+        car_size (tuple, optional): (width, length) of the car in track pixels. Defaults to (80, 120).
+    """
+    def __init__(self, shape=(64, 64), view="ego", channels=1, view_size=200, track_shape=(500, 800), car_size=(80, 120)):
+        assert view in ("ego", "global")
+        assert channels in (1, 3)
+        self.shape = tuple(shape)
+        self.view = view
+        self.channels = channels
+        self.view_size = view_size
+        self.track_shape = tuple(track_shape)
+        self.car_size = car_size
+
+        h, w = self.shape
+        if view == "ego":
+            # car frame coordinates of every output pixel centre: (forward, right)
+            scale = view_size / max(h, w)
+            self.scale = (scale, scale)
+            forward = (h/2 - np.arange(h) - 0.5) * scale
+            right = (np.arange(w) + 0.5 - w/2) * scale
+            self.grid = np.stack(np.meshgrid(forward, right, indexing="ij"), axis=-1)
+        else:
+            # track (pygame) coordinates of every output pixel centre
+            th, tw = self.track_shape
+            self.scale = (th / h, tw / w)
+            rows = (np.arange(h) + 0.5) * th / h
+            cols = (np.arange(w) + 0.5) * tw / w
+            self.grid = np.stack(np.meshgrid(cols, rows, indexing="xy"), axis=-1)
+        self._track = None  # (image, downsampled track) for the global view
+
+    def _colour(self, layer):
+        return np.asarray(layer[0] if self.channels == 1 else layer[1], dtype=np.uint8)
+
+    def _frames(self, on_line):
+        """Turn a boolean (N, h, w) line mask into (N, h, w, channels) frames."""
+        line = self._colour(LINE).reshape(-1)
+        background = self._colour(BACKGROUND).reshape(-1)
+        return np.where(on_line[..., None], line, background)
+
+    def _to_car_frame(self, points, positions, angles):
+        """Pygame coordinates (N, ..., 2) to (forward, right) relative to each car."""
+        c = np.cos(angles).reshape(-1, *([1] * (points.ndim - 2)))
+        s = np.sin(angles).reshape(c.shape)
+        dx = points[..., 0] - positions[:, None, 0].reshape(c.shape)
+        dy = -(points[..., 1] - positions[:, None, 1].reshape(c.shape))  # y-up
+        return dx*c + dy*s, dx*s - dy*c
+
+    def _splat(self, frames, rows, cols, colour, valid):
+        """Draw a small square (about one coin) at each (row, col) with `valid` set."""
+        n, h, w = frames.shape[:3]
+        radius = max(1, int(round(6 / min(self.scale))))  # coins are drawn with radius 6 by pygame
+        env = np.broadcast_to(np.arange(n).reshape(-1, *([1] * (rows.ndim - 1))), rows.shape)
+        for dr in range(-radius + 1, radius):
+            for dc in range(-radius + 1, radius):
+                r, c = rows + dr, cols + dc
+                ok = valid & (r >= 0) & (r < h) & (c >= 0) & (c < w)
+                frames[env[ok], r[ok], c[ok]] = colour
+
+    def render(self, image, positions, angles, coins=None, inverted=False):
+        """Rasterize a batch of cars.
+
+        Args:
+            image (np.array or PackedMask): Boolean track image, shape `track_shape`.
+            positions (np.array): Car positions in pygame coordinates, shape (N, 2).
+            angles (np.array): Car headings in radians (y-up, as in `Car.angle`), shape (N,).
+            coins (np.array, optional): Upcoming coins in pygame coordinates, shape (N, K, 2).
+            inverted (bool or np.array, optional): Per car colour inversion, shape (N,).
+
+        Returns:
+            np.array: uint8 frames of shape (N, height, width, channels).
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        angles = np.asarray(angles, dtype=float).reshape(-1)
+        n = len(positions)
+        inverted = np.broadcast_to(np.asarray(inverted, dtype=bool), (n,))
+        h, w = self.shape
+
+        if self.view == "ego":
+            forward, right = self.grid[..., 0], self.grid[..., 1]
+            c, s = np.cos(angles)[:, None, None], np.sin(angles)[:, None, None]
+            x = positions[:, None, None, 0] + forward*c + right*s
+            y = positions[:, None, None, 1] - (forward*s - right*c)  # pygame y points down
+            on_line = sense(image, np.stack((x, y), axis=-1), inverted[:, None, None])
+        else:
+            if self._track is None or self._track[0] is not image:
+                self._track = (image, sense(image, self.grid))
+            on_line = self._track[1][None] ^ inverted[:, None, None]
+        frames = self._frames(on_line)
+
+        if self.view == "global":
+            # the car body, as every output pixel inside the car's rectangle
+            forward, right = self._to_car_frame(np.broadcast_to(self.grid, (n, h, w, 2)), positions, angles)
+            inside = (np.abs(right) <= self.car_size[0]/2) & (np.abs(forward) <= self.car_size[1]/2)
+            frames[inside] = self._colour(CAR)
+
+        if coins is not None and len(coins):
+            coins = np.asarray(coins, dtype=float).reshape(n, -1, 2)
+            if self.view == "ego":
+                forward, right = self._to_car_frame(coins, positions, angles)
+                rows = np.floor(h/2 - forward / self.scale[0]).astype(np.intp)
+                cols = np.floor(w/2 + right / self.scale[1]).astype(np.intp)
+            else:
+                rows = np.floor(coins[..., 1] / self.scale[0]).astype(np.intp)
+                cols = np.floor(coins[..., 0] / self.scale[1]).astype(np.intp)
+            self._splat(frames, rows, cols, self._colour(COIN), np.ones(rows.shape, dtype=bool))
+        return frames
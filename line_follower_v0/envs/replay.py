@@ -0,0 +1,115 @@
+import hashlib
+
+import gymnasium as gym
+import numpy as np
+
+from .procedural import procedural_spec
+
+KEYS = ("position", "angle", "obs", "reward", "terminated", "truncated")
+# how the logging env rendered and stepped, not what it simulated: a replay is headless, on the default step
+IGNORED = ("render_mode", "copy_frames", "lean", "copy_obs")
+
+
+def replay(episodes, env_id="my_gym_envs/line_follower_v0", batch_size=4096, **kwargs):
+    """Re-simulate logged episodes, given as (seed, actions), many at a time and without rendering.
+
+    Every episode is reset exactly like `env.reset(seed=seed)` would (all of
+    `reset`'s randomness comes from the seed), its start is restored into a
+    sub-env of a vector env with `set_states`, and all episodes then step
+    together, up to `batch_size` per vector env.
+
+    Args:
+        episodes (list): (seed, actions) pairs; `actions` has one action per step.
+        env_id (str, optional): Registered line follower (v0 or v1). Defaults to v0.
+        batch_size (int, optional): Sub-envs per vector env. Defaults to 4096.
+        **kwargs: The env's arguments, as given to `gym.make` when logging. Those in
+            `IGNORED` (rendering, `lean`, `copy_obs`) are dropped.
+
+    Returns:
+        list[dict]: Per episode, arrays with one row per observation (row 0 is
+            the reset) for "position" (car frame), "angle" and "obs", and one row
+            per step for "reward", "terminated" and "truncated".
+    """
+    kwargs = {key: value for key, value in kwargs.items() if key not in IGNORED}
+    env = gym.make(env_id, **kwargs).unwrapped
+    starts = []
+    for seed, _ in episodes:
+        env.reset(seed=int(seed))
+        starts.append(env.get_state())
+    env.close()
+
+    # every sub-env of a vector env drives the same track
+    groups = {}
+    for i, state in enumerate(starts):
+        groups.setdefault(state.track.name, []).append(i)
+
+    results = [None] * len(episodes)
+    spec = procedural_spec(kwargs.get("track"))
+    for name, members in groups.items():
+        track = name
+        if spec is not None:  # regenerate the episodes' layout with the same arguments
+            track = dict(spec, seed=int(name.split(":")[1]))
+        for lo in range(0, len(members), batch_size):
+            batch = members[lo:lo + batch_size]
+            trajectories = _replay_batch(env_id, dict(kwargs, track=track), [starts[i] for i in batch], [episodes[i][1] for i in batch])
+            for i, trajectory in zip(batch, trajectories):
+                results[i] = trajectory
+    return results
+
+
+def _replay_batch(env_id, kwargs, states, actions):
+    envs = gym.make_vec(env_id, num_envs=len(states), vectorization_mode="vector_entry_point", **kwargs)
+    vec = envs.unwrapped
+    vec.reset(seed=0)
+    obs = vec.set_states(states)
+
+    actions = [np.asarray(a) for a in actions]
+    lengths = [len(a) for a in actions]
+    steps = max(lengths, default=0)
+    batch = np.zeros((steps, *envs.action_space.shape), dtype=envs.action_space.dtype)
+    for k, a in enumerate(actions):
+        batch[:len(a), k] = a  # shorter episodes are padded, the padding is cut off again below
+
+    rows = {"position": [vec.position.copy()], "angle": [vec.angle.copy()], "obs": [obs]}
+    for key in ("reward", "terminated", "truncated"):
+        rows[key] = []
+    for t in range(steps):
+        obs, reward, terminated, truncated, _ = envs.step(batch[t])
+        for key, value in zip(KEYS, (vec.position.copy(), vec.angle.copy(), obs, reward, terminated, truncated)):
+            rows[key].append(value)
+    envs.close()
+
+    rows = {key: np.stack(value, axis=1) if value else np.zeros((len(states), 0)) for key, value in rows.items()}
+    return [
+        {key: value[k, :n + 1] if key in ("position", "angle", "obs") else value[k, :n] for key, value in rows.items()}
+        for k, n in enumerate(lengths)
+    ]
+
+
+def checksum(trajectory):
+    """SHA-256 of a replayed trajectory's arrays, dtypes and shapes, to compare runs bit for bit."""
+    digest = hashlib.sha256()
+    for key in KEYS:
+        value = np.ascontiguousarray(trajectory[key])
+        digest.update(f"{key}:{value.dtype.str}:{value.shape};".encode())
+        digest.update(value.tobytes())
+    return digest.hexdigest()
+
+
+def replay_checksums(episodes, env_id="my_gym_envs/line_follower_v0", batch_size=4096, **kwargs):
+    """Checksum mode of `replay`: one `checksum` per episode instead of the arrays.
+
+    Store them with the logged episodes; `verify` later tells which episodes
+    no longer replay bit for bit (e.g. after a physics or sensor change).
+    """
+    return [checksum(trajectory) for trajectory in replay(episodes, env_id, batch_size, **kwargs)]
+
+
+def verify(episodes, checksums, env_id="my_gym_envs/line_follower_v0", batch_size=4096, **kwargs):
+    """Replay `episodes` and compare with `checksums` from an earlier `replay_checksums`.
+
+    Returns:
+        list[int]: Indices of the episodes whose trajectory changed (empty if none did).
+    """
+    current = replay_checksums(episodes, env_id, batch_size, **kwargs)
+    return [i for i, (digest, expected) in enumerate(zip(current, checksums)) if digest != expected]
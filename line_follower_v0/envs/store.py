@@ -0,0 +1,176 @@
+import glob
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from .track import PackedMask, Track, source_key, track_key
+
+
+def _default_directory():
+    # /dev/shm is RAM backed on Linux, so the "files" are shared memory
+    root = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(root, "gym_envs_tracks")
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class TrackStore:
+    """Decoded tracks published once as memory-mapped `.npy` files and shared by all processes.
+
+    The first process to ask for a track decodes it and writes the mask and the
+    subsampled waypoints to `directory`; every other process (e.g. the workers of
+    an `AsyncVectorEnv`) maps the same files read-only, so the pages are shared
+    instead of copied. Files are named after the track and a digest of its
+    `track_key`, so an edited PNG gets new files. The centerline fields are
+    published the same way by the first process that computes them (see
+    `Track.fields`), once per waypoint file whatever the colour inversion.
+
+    Each attaching process leaves a `<stem>.<pid>.lease` file. A track's reference
+    count is the number of leases whose process is still alive, so leases of
+    crashed or restarted workers stop counting without anyone having to clean up
+    after them. `cleanup()` deletes tracks nobody holds anymore.
+
+    Use `TrackStore.open(directory)` to get the process-wide store for a directory.
+    """
+    _stores = {}
+    PARTS = ("shape", "waypoints", "mask")
+    FIELD_PARTS = ("arc_length", "progress", "distance")
+
+    @classmethod
+    def open(cls, directory=None):
+        directory = os.path.abspath(directory or _default_directory())
+        if directory not in cls._stores:
+            cls._stores[directory] = cls(directory)
+        return cls._stores[directory]
+
+    def __init__(self, directory=None):
+        self.directory = directory or _default_directory()
+        os.makedirs(self.directory, exist_ok=True)
+        self._tracks = {}  # attached in this process, by stem
+
+    def _stem(self, key):
+        digest = hashlib.sha1(repr(key[1:]).encode()).hexdigest()[:12]
+        return f"{key[0]}-{digest}"
+
+    def _path(self, stem, part):
+        return os.path.join(self.directory, f"{stem}.{part}.npy")
+
+    def _publish(self, stem, track):
+        image = track.image.bits if isinstance(track.image, PackedMask) else track.image
+        shape = np.array(track.image.shape)
+        # the mask goes last, its presence marks a complete track
+        self._write(stem, (("shape", shape), ("waypoints", track.waypoints), ("mask", image)))
+
+    def _write(self, stem, parts):
+        for part, arr in parts:
+            path = self._path(stem, part)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, path)  # atomic, concurrent publishers write the same bytes
+
+    def load_fields(self, stem):
+        """The centerline fields stored under `stem`, memory-mapped, or None if nobody published them yet."""
+        if not os.path.exists(self._path(stem, self.FIELD_PARTS[-1])):
+            return None
+        return tuple(np.load(self._path(stem, part), mmap_mode="r") for part in ("distance", "progress", "arc_length"))
+
+    def publish_fields(self, stem, fields):
+        """Store computed fields under `stem` and return them memory-mapped."""
+        distance, progress, arc_length = fields
+        # the distance goes last, its presence marks complete fields
+        self._write(stem, (("arc_length", arc_length), ("progress", progress), ("distance", distance)))
+        return self.load_fields(stem)
+
+    def get(self, name, png_path, npy_path, invert_colours=False, packed=False):
+        """Attach to a track, publishing it first if no process has yet."""
+        key = track_key(name, png_path, npy_path, invert_colours, packed)
+        stem = self._stem(key)
+        track = self._tracks.get(stem)
+        if track is not None:
+            return track
+        if npy_path is None:
+            # a compiled bundle is already a memory-mapped file shared by every process
+            track = self._tracks[stem] = Track.from_bundle(name, png_path, invert_colours, packed)
+            return track
+
+        # lease first, so a concurrent `cleanup()` can't delete the files between checking and mapping them
+        leases = [self._lease(stem)]
+        try:
+            if not all(os.path.exists(self._path(stem, part)) for part in self.PARTS):
+                self._publish(stem, Track(name, png_path, npy_path, invert_colours, packed))
+            image = np.load(self._path(stem, "mask"), mmap_mode="r")
+            waypoints = np.load(self._path(stem, "waypoints"), mmap_mode="r")
+            shape = np.load(self._path(stem, "shape"))
+            if packed:
+                image = PackedMask(bits=image, shape=shape)
+            # fields depend on the waypoint file only: both colour inversions share them
+            fields_stem = self._stem((f"{name}-fields", *source_key(npy_path, shape)))
+            leases.append(self._lease(fields_stem))
+            fields = self.load_fields(fields_stem)
+        except BaseException:
+            for lease in leases:
+                os.remove(lease)
+            raise
+
+        track = Track.from_arrays(name, png_path, npy_path, image, waypoints, bool(invert_colours), fields)
+        track.field_store = (self, fields_stem)
+        self._tracks[stem] = track
+        return track
+
+    def _lease_path(self, stem):
+        return os.path.join(self.directory, f"{stem}.{os.getpid()}.lease")
+
+    def _lease(self, stem):
+        path = self._lease_path(stem)
+        open(path, "a").close()
+        return path
+
+    def refcount(self, stem):
+        """Number of live processes attached to the track stored under `stem`."""
+        leases = glob.glob(os.path.join(glob.escape(self.directory), f"{glob.escape(stem)}.*.lease"))
+        return sum(_alive(int(lease.rsplit(".", 2)[1])) for lease in leases)
+
+    def release(self):
+        """Detach this process from every track it attached to.
+
+        Optional: a process that exits without calling it stops counting anyway.
+        """
+        for stem, track in self._tracks.items():
+            stems = (stem,) if track.field_store is None else (stem, track.field_store[1])
+            for leased in stems:
+                try:
+                    os.remove(self._lease_path(leased))
+                except FileNotFoundError:
+                    pass
+        self._tracks.clear()
+
+    def cleanup(self):
+        """Delete tracks with no live process attached, along with stale leases.
+
+        Returns:
+            list[str]: Stems of the deleted tracks.
+        """
+        removed = []
+        for marker in ("mask", "distance"):  # tracks and fields
+            for found in glob.glob(os.path.join(glob.escape(self.directory), f"*.{marker}.npy")):
+                stem = os.path.basename(found)[:-len(f".{marker}.npy")]
+                if self.refcount(stem):
+                    continue
+                for path in glob.glob(os.path.join(glob.escape(self.directory), f"{glob.escape(stem)}.*")):
+                    os.remove(path)
+                removed.append(stem)
+        # leases of fields nobody computed
+        for lease in glob.glob(os.path.join(glob.escape(self.directory), "*.lease")):
+            if not _alive(int(lease.rsplit(".", 2)[1])):
+                os.remove(lease)
+        return removed
@@ -0,0 +1,485 @@
+import io
+import math
+import os
+import struct
+import zipfile
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from .png import imread
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+BUNDLE_SUFFIX = ".track.npz"
+BUNDLE_FORMAT = 1
+
+
+def rgb2gray(rgb):
+    return np.dot(rgb[..., :4], [0.25, 0.25, 0.25, 0.25])
+
+
+def centerline_fields(waypoints, shape, chunk=64):
+    """Signed distance to the waypoint polyline and lap progress for every pixel.
+
+    The waypoints are treated as a closed polyline. For each pixel centre the
+    nearest point on the polyline is found by brute force over the segments, a
+    few rows at a time.
+
+    Args:
+        waypoints (np.array): Waypoints of shape (n, 2) in pygame coordinates.
+        shape (tuple): (height, width) of the track image.
+        chunk (int, optional): Rows processed at once. Defaults to 64.
+
+    Returns:
+        distance (np.array): float32 (height, width). Distance in pixels to the
+            centerline, positive on the right of the waypoint direction as seen on
+            screen and negative on the left.
+        progress (np.array): float32 (height, width). Arc length of the nearest
+            centerline point from waypoints[0], as a fraction of the lap in [0, 1).
+        arc_length (np.array): Cumulative arc length at each waypoint, shape (n + 1,).
+    """
+    a, d, seg_len, arc_length = centerline_polyline(waypoints)
+    h, w = shape
+    distance = np.empty(shape, np.float32)
+    progress = np.empty(shape, np.float32)
+    xs = np.arange(w, dtype=np.float32) + 0.5
+    for r0 in range(0, h, chunk):
+        ys = np.arange(r0, min(r0 + chunk, h), dtype=np.float32)[:, None] + 0.5
+        best = np.full((len(ys), w), np.inf, np.float32)
+        along = np.zeros_like(best)
+        side = np.zeros_like(best)
+        for k in range(len(a)):
+            rx, ry = xs - a[k, 0], ys - a[k, 1]
+            t = np.clip((rx*d[k, 0] + ry*d[k, 1]) / max(seg_len[k]**2, 1e-12), 0, 1)
+            ex, ey = rx - t*d[k, 0], ry - t*d[k, 1]
+            dd = ex*ex + ey*ey
+            closer = dd < best
+            best[closer] = dd[closer]
+            along[closer] = (arc_length[k] + t*seg_len[k])[closer]
+            side[closer] = (d[k, 0]*ry - d[k, 1]*rx)[closer]
+        distance[r0:r0 + len(ys)] = np.where(side < 0, -1, 1) * np.sqrt(best)
+        progress[r0:r0 + len(ys)] = (along / arc_length[-1]) % 1
+    return distance, progress, arc_length
+
+
+def centerline_polyline(waypoints):
+    """Float32 start points (n, 2), directions (n, 2) and lengths (n,) of the closed polyline's segments, and `arc_lengths`."""
+    a = waypoints.astype(np.float32)
+    d = np.roll(a, -1, axis=0) - a
+    seg_len = np.linalg.norm(d, axis=1)
+    return a, d, seg_len, np.concatenate(([0], np.cumsum(seg_len)))
+
+
+def centerline_at(polyline, col, row):
+    """`centerline_fields` at pixels (`row`, `col`) only, without computing the fields.
+
+    The same float32 arithmetic per pixel and segment, vectorized over the
+    segments instead of the pixels, so the results are identical to reading
+    the fields.
+
+    Args:
+        polyline (tuple): `centerline_polyline` of the waypoints.
+        col, row (np.array): Integer pixel indices of shape (m,).
+
+    Returns:
+        (np.array, np.array): float32 distance and progress, shape (m,).
+    """
+    a, d, seg_len, arc_length = polyline
+    xs = col.astype(np.float32)[:, None] + 0.5
+    ys = row.astype(np.float32)[:, None] + 0.5
+    rx, ry = xs - a[:, 0], ys - a[:, 1]
+    t = np.clip((rx*d[:, 0] + ry*d[:, 1]) / np.maximum(seg_len**2, 1e-12), 0, 1)
+    ex, ey = rx - t*d[:, 0], ry - t*d[:, 1]
+    dd = ex*ex + ey*ey
+    k = np.argmin(dd, axis=1)  # the first nearest segment, as the strict `<` in `centerline_fields`
+    m = np.arange(len(k))
+    along = (arc_length[k] + t[m, k]*seg_len[k]).astype(np.float32)
+    side = d[k, 0]*ry[m, k] - d[k, 1]*rx[m, k]
+    distance = (np.where(side < 0, -1, 1) * np.sqrt(dd[m, k])).astype(np.float32)
+    return distance, ((along / arc_length[-1]) % 1).astype(np.float32)
+
+
+def arc_lengths(waypoints):
+    """Cumulative arc length of the closed waypoint polyline, as in `centerline_fields`."""
+    a = waypoints.astype(np.float32)
+    seg_len = np.linalg.norm(np.roll(a, -1, axis=0) - a, axis=1)
+    return np.concatenate(([0], np.cumsum(seg_len)))
+
+
+def map_npz(path):
+    """Members of an uncompressed `.npz` as read-only views into one memory map of the file.
+
+    `np.load` reads (and copies) every member of an archive separately; since
+    `np.savez` stores members uncompressed, their data can be used in place.
+    """
+    buf = np.memmap(path, mode="r")
+    arrays = {}
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: member {info.filename} is compressed, save with np.savez")
+            # local file header: 30 fixed bytes, then the file name and the extra field
+            name_len, extra_len = struct.unpack("<HH", buf[info.header_offset + 26:info.header_offset + 30])
+            start = info.header_offset + 30 + name_len + extra_len
+            header = io.BytesIO(buf[start:start + min(info.file_size, 65536)])
+            if np.lib.format.read_magic(header) == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(header)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(header)
+            offset = start + header.tell()
+            arr = buf[offset:offset + int(np.prod(shape)) * dtype.itemsize].view(dtype)
+            arrays[info.filename[:-len(".npy")]] = arr.reshape(shape, order="F" if fortran else "C")
+    return arrays
+
+
+def source_key(path, shape):
+    """Identity of a track's waypoint source: what its centerline fields depend on (not the colour inversion)."""
+    return os.path.realpath(path), os.stat(path).st_mtime_ns, tuple(int(n) for n in shape)
+
+
+class FieldCache:
+    """Process-wide LRU cache of computed centerline fields, keyed by `source_key`.
+
+    Both colour inversions of a track (and every env using either) share one
+    entry. Fields mapped from a bundle or the track store are not kept here.
+    """
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._fields = OrderedDict()
+
+    def get(self, key):
+        fields = self._fields.get(key)
+        if fields is not None:
+            self._fields.move_to_end(key)
+        return fields
+
+    def put(self, key, fields):
+        self._fields[key] = fields
+        while len(self._fields) > max(self.maxsize, 0):
+            self._fields.popitem(last=False)
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._fields))
+
+    def clear(self):
+        self._fields.clear()
+        self.hits = self.misses = 0
+
+
+field_cache = FieldCache()
+
+
+class PackedMask:
+    """Boolean track mask stored with `np.packbits`, one bit per pixel.
+
+    Indexing with integer (row, col) arrays reads the bits directly, so it can be
+    passed to `car.sense` in place of the boolean image.
+    """
+    def __init__(self, mask=None, bits=None, shape=None):
+        if mask is not None:
+            bits, shape = np.packbits(mask, axis=1), mask.shape
+        self.shape = tuple(shape)
+        self.bits = bits
+        self.bits.flags.writeable = False
+
+    def __getitem__(self, index):
+        row, col = index
+        return ((self.bits[row, col >> 3] >> (7 - (col & 7))) & 1).astype(bool)
+
+    def unpack(self):
+        return np.unpackbits(self.bits, axis=1, count=self.shape[1]).astype(bool)
+
+
+class Track:
+    """A decoded track: boolean mask, subsampled waypoints and a lazy pygame surface.
+
+    The arrays are read-only since one `Track` is shared by every env using it.
+    With `packed=True` the mask is kept as a `PackedMask` (8x smaller).
+    """
+    # point lookups answered from the waypoint polyline (about 60 us each) before
+    # computing the fields (about 0.4 s) pays off, see `lookup`
+    fields_after = 5000
+
+    def __init__(self, name, png_path, npy_path, invert_colours=False, packed=False):
+        self.name = name
+        self.png_path = png_path
+        self.npy_path = npy_path
+        self.invert_colours = invert_colours
+
+        self.image = (1 - rgb2gray(imread(png_path))).astype(bool)
+        if invert_colours:
+            self.image = np.logical_not(self.image)
+        self.waypoints = np.load(npy_path)[::10]
+        if packed:
+            self.image = PackedMask(self.image)
+        else:
+            self.image.flags.writeable = False
+        self.waypoints.flags.writeable = False
+        self._surface = None
+        self._background = None
+        self._display = None
+        self._init_fields(None, source_key(npy_path, self.image.shape))
+
+    @classmethod
+    def from_arrays(cls, name, png_path, npy_path, image, waypoints, invert_colours=False, fields=None, display=None, fields_key=None):
+        """Wrap already decoded (e.g. memory-mapped) arrays without touching the PNG.
+
+        `fields_key` (see `source_key`) shares computed fields through `field_cache`.
+        """
+        track = cls.__new__(cls)
+        track.name = name
+        track.png_path = png_path
+        track.npy_path = npy_path
+        track.invert_colours = invert_colours
+        track.image = image
+        track.waypoints = waypoints
+        track._surface = None
+        track._background = None
+        track._display = display
+        track._init_fields(fields, fields_key)
+        return track
+
+    def _init_fields(self, fields, fields_key):
+        self._fields = fields  # given (memory-mapped) fields; computed ones live in `field_cache`
+        self.fields_key = fields_key
+        self.field_store = None  # (TrackStore, stem) the fields are published to once computed
+        self._polyline = None
+        self._lookups = 0
+
+    @classmethod
+    def from_bundle(cls, name, path, invert_colours=False, packed=False):
+        """Map a compiled track bundle (see `save_bundle`); nothing is decoded.
+
+        Without colour inversion the mask, waypoints and fields are views into the
+        memory-mapped file, so processes using the same bundle share its pages.
+        """
+        arrays = map_npz(path)
+        if int(arrays["format"]) != BUNDLE_FORMAT:
+            raise ValueError(f"{path}: track bundle format {int(arrays['format'])}, expected {BUNDLE_FORMAT}")
+        shape = tuple(int(n) for n in arrays["shape"])
+        if packed:
+            bits = arrays["bits"] if "bits" in arrays else np.packbits(arrays["mask"], axis=1)
+            image = PackedMask(bits=~bits if invert_colours else bits, shape=shape)
+        else:
+            image = arrays["mask"] if "mask" in arrays else PackedMask(bits=arrays["bits"], shape=shape).unpack()
+            if invert_colours:
+                image = np.logical_not(image)
+            image.flags.writeable = False
+        fields = None
+        if "distance" in arrays:
+            fields = (arrays["distance"], arrays["progress"], arrays["arc_length"])
+        display = arrays["display"]
+        if invert_colours:
+            display = 255 - display
+        return cls.from_arrays(
+            name, path, None, image, arrays["waypoints"], bool(invert_colours), fields, display, source_key(path, shape)
+        )
+
+    def save_bundle(self, path, fields=True, packed=False):
+        """Write this track as one uncompressed `.npz` that `from_bundle` maps back.
+
+        Holds the mask (boolean, or bit-packed with `packed`), the subsampled
+        waypoints, their cumulative arc length, the centerline distance and
+        progress fields (unless `fields=False`) and an RGB display image.
+        Save a track loaded without colour inversion; inversion happens on load.
+        """
+        mask = self.image.unpack() if isinstance(self.image, PackedMask) else np.asarray(self.image)
+        arrays = dict(
+            format=np.array(BUNDLE_FORMAT),
+            shape=np.array(mask.shape),
+            waypoints=np.asarray(self.waypoints),
+            arc_length=arc_lengths(self.waypoints),
+            display=self.display,
+        )
+        if packed:
+            arrays["bits"] = np.packbits(mask, axis=1)
+        else:
+            arrays["mask"] = mask
+        if fields:
+            arrays["distance"], arrays["progress"], arrays["arc_length"] = self.fields
+        np.savez(path, **arrays)
+
+    @property
+    def display(self):
+        """uint8 RGB image (height, width, 3) of the track composited on white."""
+        if self._display is None and self.png_path is None:
+            # generated track, see `procedural_track`: drawn straight from the (already inverted) mask
+            mask = self.image.unpack() if isinstance(self.image, PackedMask) else np.asarray(self.image)
+            self._display = np.repeat(np.where(mask, 0, 255).astype(np.uint8)[..., None], 3, axis=-1)
+        if self._display is None:
+            rgba = imread(self.png_path)
+            alpha = rgba[..., 3:] if rgba.shape[-1] == 4 else 1
+            display = np.round((rgba[..., :3] * alpha + (1 - alpha)) * 255).astype(np.uint8)
+            if self.invert_colours:
+                display = 255 - display
+            self._display = display
+        return self._display
+
+    @property
+    def fields(self):
+        """(distance, progress, arc_length) from `centerline_fields`, computed on first use.
+
+        Computed once per waypoint source (`fields_key`) and process, whatever
+        the colour inversion, and published to the `field_store` if there is one.
+        """
+        fields = self._cached_fields()
+        if fields is not None:
+            return fields
+        if self.field_store is not None:
+            store, stem = self.field_store
+            fields = store.load_fields(stem)
+            if fields is None:
+                fields = store.publish_fields(stem, centerline_fields(self.waypoints, self.image.shape))
+            self._fields = fields  # memory-mapped, shared with the other processes
+            return fields
+        fields = centerline_fields(self.waypoints, self.image.shape)
+        for field in fields:
+            field.flags.writeable = False
+        if self.fields_key is None:
+            self._fields = fields
+        else:
+            field_cache.misses += 1
+            field_cache.put(self.fields_key, fields)
+        return fields
+
+    def _cached_fields(self):
+        if self._fields is not None or self.fields_key is None:
+            return self._fields
+        fields = field_cache.get(self.fields_key)
+        if fields is not None:
+            field_cache.hits += 1
+        return fields
+
+    def lookup(self, points):
+        """Signed distance to the centerline and lap progress at pygame positions.
+
+        Constant time per point: two reads from the precomputed fields. Until
+        `fields_after` points have been looked up (and unless the fields are already
+        available) the same values are computed from the waypoint polyline instead,
+        so tracks used briefly, like generated ones, never pay for the fields.
+        Points off the image use the nearest edge pixel, with the distance to that
+        pixel added to the magnitude.
+
+        Args:
+            points (np.array): Positions of shape (..., 2) in pygame coordinates.
+
+        Returns:
+            distance (np.array): Shape (...); see `centerline_fields`.
+            progress (np.array): Shape (...); see `centerline_fields`.
+        """
+        h, w = self.image.shape
+        points = np.asarray(points)
+        clamped = np.clip(points, 0, (w - 1e-3, h - 1e-3))
+        col, row = clamped[..., 0].astype(np.intp), clamped[..., 1].astype(np.intp)
+        fields = self._cached_fields()
+        if fields is None:
+            self._lookups += col.size
+            if self._lookups > self.fields_after:
+                fields = self.fields
+        if fields is None:
+            if self._polyline is None:
+                self._polyline = centerline_polyline(self.waypoints)
+            d, p = centerline_at(self._polyline, col.reshape(-1), row.reshape(-1))
+            d, p = d.reshape(col.shape), p.reshape(col.shape)
+        else:
+            distance, progress, _ = fields
+            d, p = distance[row, col], progress[row, col]
+        d = d + np.copysign(np.linalg.norm(points - clamped, axis=-1), d)
+        return d, p
+
+    def lookup_point(self, x, y):
+        """`lookup` of a single pygame position, on Python floats: no arrays (the lean step path).
+
+        Always reads the fields, computing them on first use.
+        """
+        distance, progress, _ = self.fields
+        h, w = distance.shape
+        clamped_x, clamped_y = min(max(x, 0.0), w - 1e-3), min(max(y, 0.0), h - 1e-3)
+        col, row = int(clamped_x), int(clamped_y)
+        d = float(distance[row, col])
+        d += math.copysign(math.hypot(x - clamped_x, y - clamped_y), d)
+        return d, float(progress[row, col])
+
+    @property
+    def surface(self):
+        """pygame surface of the track, only built the first time it is drawn."""
+        if self._surface is None:
+            import pygame
+            if self.npy_path is None:  # compiled bundle or generated track, no PNG to load
+                self._surface = pygame.surfarray.make_surface(self.display.transpose(1, 0, 2))
+                return self._surface
+            surface = pygame.image.load(self.png_path)#.convert_alpha()
+            if self.invert_colours:
+                arr = pygame.surfarray.array3d(surface)
+                arr = 255 - arr
+                surface = pygame.surfarray.make_surface(arr)#.convert_alpha()
+            self._surface = surface
+        return self._surface
+
+    @property
+    def background(self):
+        """The static part of every frame: the track on white, composited once."""
+        if self._background is None:
+            import pygame
+            background = pygame.Surface(self.surface.get_size())
+            background.fill((255, 255, 255))
+            background.blit(self.surface, (0, 0))
+            self._background = background
+        return self._background
+
+
+def track_key(name, png_path, npy_path, invert_colours=False, packed=False):
+    """Identity of a decoded track; changes whenever either source file changes.
+
+    For a compiled bundle `png_path` is the bundle and `npy_path` is None.
+    """
+    return (
+        name,
+        os.path.realpath(png_path),
+        os.stat(png_path).st_mtime_ns,
+        None if npy_path is None else os.stat(npy_path).st_mtime_ns,
+        bool(invert_colours),
+        bool(packed),
+    )
+
+
+class TrackCache:
+    """Process-wide LRU cache of decoded tracks.
+
+    Entries are keyed by (track name, resolved png path, mtimes of both files,
+    colour inversion, packing), so editing a track file on disk invalidates it. Waypoint
+    inversion is not part of the key since reversing the waypoints is a view.
+    """
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._tracks = OrderedDict()
+
+    def get(self, name, png_path, npy_path, invert_colours=False, packed=False):
+        key = track_key(name, png_path, npy_path, invert_colours, packed)
+        track = self._tracks.get(key)
+        if track is not None:
+            self.hits += 1
+            self._tracks.move_to_end(key)
+            return track
+
+        self.misses += 1
+        if npy_path is None:
+            track = Track.from_bundle(name, png_path, invert_colours=bool(invert_colours), packed=bool(packed))
+        else:
+            track = Track(name, png_path, npy_path, invert_colours=bool(invert_colours), packed=bool(packed))
+        self._tracks[key] = track
+        while len(self._tracks) > max(self.maxsize, 0):
+            self._tracks.popitem(last=False)
+        return track
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._tracks))
+
+    def clear(self):
+        self._tracks.clear()
+        self.hits = self.misses = 0
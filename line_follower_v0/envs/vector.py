@@ -0,0 +1,362 @@
+import copy
+
+import numpy as np
+from gymnasium import spaces
+from gymnasium.vector import VectorEnv, AutoresetMode
+from gymnasium.vector.utils import batch_space
+
+from .car import to_pygame, Car, INTEGRATORS, integrate, rotate_points, lookup_sensors, sensor_table, sense
+from .procedural import procedural_spec, procedural_track
+from .raster import Rasterizer
+from .store import TrackStore
+from .main import EnvState, LineFollowerEnv, action_to_inputs, packed_obs_space, pack_obs, pixels_obs_space, WIDTH, HEIGHT
+
+
+class LineFollowerVectorEnv(VectorEnv):
+    """N line follower cars on one shared track, simulated as NumPy arrays.
+
+    Equivalent to `num_envs` copies of `LineFollowerEnv`, but the car poses,
+    coin cursors and step counters are stored as structure-of-arrays so every
+    step moves, senses and rewards all cars with a handful of batched NumPy
+    calls. Sub-envs autoreset on the step after they finish (next-step mode).
+
+    `lean` and `copy_obs` are accepted so that the keyword arguments of a
+    `LineFollowerEnv` can be passed unchanged, but do nothing: the batched step
+    allocates per batch rather than per car, keeps the float64 pose, and always
+    returns new observation arrays.
+    """
+    metadata = {"render_modes": [], "autoreset_mode": AutoresetMode.NEXT_STEP}
+
+    def __init__(
+        self, num_envs=1,
+        render_mode=None,
+        sensor_grid=(4, 6),
+        track="path",
+        max_steps=200,
+        hitbox=20,
+        x_spacing=20,
+        y_spacing=20,
+        verbose=False,
+        invert_waypoints=None,
+        invert_colours=None,
+        sensor_lut_error=None,
+        packed_track=False,
+        obs_mode="binary",
+        pixels=None,
+        track_store=None,
+        max_distance=None,
+        dt=0.05,
+        frame_skip=1,
+        step_unit="agent",
+        integrator="midpoint",
+        substeps=1,
+        lean=False,
+        copy_obs=True,
+    ):
+        assert render_mode is None, "LineFollowerVectorEnv does not render"
+        self.num_envs = num_envs
+        self.render_mode = render_mode
+        self.sensor_grid = sensor_grid
+        self.track = track
+        self.max_steps = max_steps
+        self.hitbox = hitbox
+        self.x_spacing = x_spacing
+        self.y_spacing = y_spacing
+        self.verbose = verbose
+        self.invert_waypoints = invert_waypoints
+        self.invert_colours = invert_colours
+        self.max_distance = max_distance
+        self.dt = dt
+        self.frame_skip = frame_skip
+        assert step_unit in ("agent", "tick")
+        self.step_unit = step_unit
+        assert integrator in INTEGRATORS
+        self.integrator = integrator
+        self.substeps = substeps
+        self.sensor_table = None if sensor_lut_error is None else sensor_table(
+            tuple(sensor_grid), x_spacing, y_spacing, sensor_lut_error
+        )
+
+        self.packed_track = packed_track
+        self.track_store = None
+        if track_store:
+            self.track_store = TrackStore.open(None if track_store is True else track_store)
+        assert obs_mode in ("binary", "packed", "pixels")
+        self.obs_mode = obs_mode
+        self.rasterizer = None
+
+        if obs_mode == "packed":
+            self.single_observation_space = packed_obs_space(sensor_grid[0] * sensor_grid[1])
+        elif obs_mode == "pixels":
+            self.rasterizer = Rasterizer(
+                car_size=(sensor_grid[0] * y_spacing, sensor_grid[1] * x_spacing), **(pixels or {})
+            )
+            self.single_observation_space = pixels_obs_space(self.rasterizer)
+        else:
+            self.single_observation_space = spaces.MultiBinary(
+                (sensor_grid[0] * sensor_grid[1],)
+            )
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.single_action_space = spaces.Discrete(len(action_to_inputs))
+        self.action_space = batch_space(self.single_action_space, num_envs)
+
+        # same body and sensor layout as `Car`
+        self.width = sensor_grid[0] * y_spacing  # also the distance between the wheels
+        self.sensor_points = Car._get_sensor_points_(self.width, sensor_grid[1] * x_spacing, *sensor_grid)
+
+        self.load_track(track)
+
+        self.position = None  # (N, 2) in the car's (y-up) frame
+        self.angle = None     # (N,)
+        self.start = None     # (N,) index of the first coin
+        self.cursor = None    # (N,) coins collected this episode
+        self.reversed = None  # (N,) which waypoint direction each car drives
+        self.inverted = None  # (N,) whether each car sees the inverted track
+        self.curr_step = None
+        self.prev_done = None
+        self.viewer = None
+        self.viewer_index = 0
+
+    def _get_track(self, track, invert_colours=False):
+        spec = procedural_spec(track)
+        if spec is not None:
+            if spec.get("seed") is None:
+                raise ValueError(f"All sub-envs share one track, give the procedural track a seed (e.g. \"random:0\"), got {track!r}.")
+            return procedural_track(invert_colours=invert_colours, packed=self.packed_track, **spec)
+        png_path, npy_path = LineFollowerEnv.find_track(track)
+        tracks = self.track_store or LineFollowerEnv.track_cache
+        return tracks.get(track, png_path, npy_path, invert_colours, packed=self.packed_track)
+
+    def load_track(self, track: str):
+        # loaded without colour inversion, each car's `inverted` flag flips what it senses
+        self._track = self._get_track(track)
+        self.track_image = self._track.image
+        waypoints = self._track.waypoints
+        # both directions, indexed by `self.reversed`
+        self.waypoints = np.stack((waypoints, waypoints[::-1]))
+
+    def _action_to_speeds(self, actions):
+        return action_to_inputs[np.asarray(actions)]
+
+    def _coin(self, idx):
+        n = self.waypoints.shape[1]
+        return self.waypoints[self.reversed[idx], (self.start[idx] + self.cursor[idx]) % n]
+
+    def _flip(self, values, n):
+        if values is None:
+            return self.np_random.integers(0, 2, size=n).astype(bool)
+        return np.full(n, values, dtype=bool)
+
+    def _reset_envs(self, mask):
+        """Put a fresh car on the track for every sub-env selected by `mask`."""
+        n = int(mask.sum())
+        n_wp = self.waypoints.shape[1]
+        self.reversed[mask] = self._flip(self.invert_waypoints, n)
+        self.inverted[mask] = self._flip(self.invert_colours, n)
+
+        idx = self.np_random.integers(0, n_wp - 1, size=n)
+        wps = self.waypoints[self.reversed[mask]]
+        rows = np.arange(n)
+        this_pos = wps[rows, idx]
+        vec = wps[rows, (idx + 1) % n_wp] - this_pos
+
+        self.position[mask] = this_pos
+        self.position[mask, 1] = HEIGHT - this_pos[:, 1]  # to_pygame
+        self.angle[mask] = np.arctan2(-vec[:, 1], vec[:, 0])
+        self.start[mask] = (idx + 2) % n_wp
+        self.cursor[mask] = 0
+        self.curr_step[mask] = 0
+
+    def _move(self, speeds, dt):
+        """Batched `Car.move`."""
+        speeds = speeds * 100
+        self.position, self.angle = integrate(
+            self.position, self.angle, speeds[:, 0], speeds[:, 1], dt,
+            self.width, self.integrator, self.substeps,
+        )
+
+    def _get_obs(self):
+        """Batched `Car.get_state` (or `Rasterizer.render` for pixel observations)."""
+        if self.obs_mode == "pixels":
+            position = self.position.copy()
+            position[:, 1] = HEIGHT - position[:, 1]
+            n_wp = self.waypoints.shape[1]
+            upcoming = (self.start + self.cursor)[:, None] + np.arange(max(n_wp // 10, 1))
+            coins = self.waypoints[self.reversed[:, None], upcoming % n_wp]
+            return self.rasterizer.render(self.track_image, position, self.angle, coins, self.inverted)
+        if self.sensor_table is None:
+            offsets = rotate_points(self.sensor_points, self.angle)
+        else:
+            offsets = lookup_sensors(self.sensor_table, self.angle)
+        sensors = offsets + self.position[:, None]
+        sensors[..., 1] = HEIGHT - sensors[..., 1]  # to_pygame
+        vals = sense(self.track_image, sensors, self.inverted[:, None])
+        if self.obs_mode == "packed":
+            return pack_obs(vals, self.single_observation_space.dtype)
+        return vals
+
+    def _get_reward(self):
+        """Batched `Coins.get_reward`; coins still have to be collected in order."""
+        reward = np.zeros(self.num_envs, dtype=np.int64)
+        position = self.position.copy()
+        position[:, 1] = HEIGHT - position[:, 1]
+        n_wp = self.waypoints.shape[1]
+        active = np.arange(self.num_envs)
+        while len(active):
+            dist = np.linalg.norm(position[active] - self._coin(active), axis=1)
+            active = active[(dist < self.hitbox) & (reward[active] < n_wp)]
+            reward[active] += 1
+            self.cursor[active] += 1
+        return reward
+
+    def centerline(self):
+        """Batched `LineFollowerEnv.centerline`."""
+        position = self.position.copy()
+        position[:, 1] = HEIGHT - position[:, 1]
+        distance, progress = self._track.lookup(position)
+        flip = self.reversed.astype(bool)
+        return np.where(flip, -distance, distance), np.where(flip, (1 - progress) % 1, progress)
+
+    def _get_info(self):
+        distance, progress = self.centerline()
+        return {
+            "cursor": self.cursor.copy(),
+            "laps": self.cursor // self.waypoints.shape[1],
+            "distance": distance,
+            "progress": progress,
+        }
+
+    def get_states(self, indices=None):
+        """`LineFollowerEnv.get_state` snapshots of the sub-envs `indices` (default: all).
+
+        Each can be restored into a `LineFollowerEnv` or back into a sub-env with
+        `set_states`. They all hold a copy of the state of the vector env's shared RNG.
+        """
+        assert self.position is not None, "Call reset before using get_states method."
+        indices = range(self.num_envs) if indices is None else indices
+        tracks = {False: self._track}
+        rng = self.np_random.bit_generator.state
+        states = []
+        for i in indices:
+            inverted = bool(self.inverted[i])
+            if inverted not in tracks:
+                tracks[inverted] = self._get_track(self.track, inverted)
+            states.append(EnvState(
+                track=tracks[inverted],
+                reversed=bool(self.reversed[i]),
+                position=tuple(float(x) for x in self.position[i]),
+                angle=float(self.angle[i]),
+                start=int(self.start[i]),
+                cursor=int(self.cursor[i]),
+                curr_step=int(self.curr_step[i]),
+                rng=copy.deepcopy(rng),
+            ))
+        return states
+
+    def set_states(self, states, indices=None):
+        """Restore many `EnvState` snapshots at once, `states[k]` into sub-env `indices[k]`.
+
+        `indices` defaults to the first `len(states)` sub-envs. The snapshots may
+        come from `LineFollowerEnv.get_state` or `get_states`, but must be of this
+        env's track. Their RNG states are ignored since the sub-envs share one RNG.
+        Restored sub-envs continue normally on the next `step()`.
+
+        Returns:
+            np.array: Observations of all sub-envs, restored ones included.
+        """
+        assert self.position is not None, "Call reset before using set_states method."
+        indices = np.arange(len(states)) if indices is None else np.asarray(indices)
+        for state in states:
+            if state.track.name != self._track.name:
+                raise ValueError(f"Snapshot of track {state.track.name!r} can't be restored on track {self._track.name!r}.")
+        self.position[indices] = [state.position for state in states]
+        self.angle[indices] = [state.angle for state in states]
+        self.start[indices] = [state.start for state in states]
+        self.cursor[indices] = [state.cursor for state in states]
+        self.curr_step[indices] = [state.curr_step for state in states]
+        self.reversed[indices] = [state.reversed for state in states]
+        self.inverted[indices] = [state.track.invert_colours for state in states]
+        self.prev_done[indices] = False
+        observation = self._get_obs()
+        if self.viewer is not None:
+            self._publish(observation)
+        return observation
+
+    def attach_viewer(self, index=0, fps=30):
+        """Watch sub-env `index` live without slowing the batch down, see `LineFollowerEnv.attach_viewer`."""
+        from .viewer import Viewer  # imports pygame
+        self.detach_viewer()
+        self.viewer_index = index
+        self.viewer = Viewer(fps, size=(WIDTH, HEIGHT)).start()
+        if self.position is not None:
+            self._publish()
+        return self.viewer
+
+    def detach_viewer(self):
+        if self.viewer is not None:
+            self.viewer.close()
+            self.viewer = None
+
+    def _publish(self, observation=None):
+        i = self.viewer_index
+        if observation is not None and self.obs_mode == "binary":
+            vals = observation[i]
+        else:
+            vals = sense(self.track_image, to_pygame(rotate_points(self.sensor_points, self.angle[i]) + self.position[i]), self.inverted[i])
+        self.viewer.publish(
+            self._track, self.position[i], self.angle[i],
+            self.waypoints[self.reversed[i]], self.start[i], self.cursor[i], self.hitbox,
+            vals=vals, sensor_grid=self.sensor_grid, x_spacing=self.x_spacing, y_spacing=self.y_spacing,
+            inverted=self.inverted[i],
+        )
+
+    def reset(self, *, seed=None, options=None):
+        super().reset(seed=seed)
+        n = self.num_envs
+        self.position = np.zeros((n, 2))
+        self.angle = np.zeros(n)
+        self.start = np.zeros(n, dtype=np.int64)
+        self.cursor = np.zeros(n, dtype=np.int64)
+        self.reversed = np.zeros(n, dtype=np.intp)
+        self.inverted = np.zeros(n, dtype=bool)
+        self.curr_step = np.zeros(n, dtype=np.int64)
+        self.prev_done = np.zeros(n, dtype=bool)
+
+        self._reset_envs(np.ones(n, dtype=bool))
+        observation = self._get_obs()
+        if self.viewer is not None:
+            self._publish(observation)
+        return observation, self._get_info()
+
+    def step(self, actions):
+        assert self.position is not None, "Call reset before using step method."
+        speeds = self._action_to_speeds(actions)
+        reward = np.zeros(self.num_envs, dtype=np.int64)
+        for _ in range(self.frame_skip):
+            self._move(speeds, self.dt)
+            reward += self._get_reward()
+        self.curr_step += self.frame_skip if self.step_unit == "tick" else 1
+
+        # sub-envs that finished last step start over instead of moving
+        if self.prev_done.any():
+            self._reset_envs(self.prev_done)
+
+        observation = self._get_obs()
+        info = self._get_info()
+        if self.viewer is not None:
+            self._publish(observation)
+        if self.max_distance is None:
+            terminated = np.zeros(self.num_envs, dtype=bool)
+        else:
+            terminated = np.abs(info["distance"]) > self.max_distance
+        truncated = self.curr_step > self.max_steps
+
+        reward[self.prev_done] = 0
+        terminated[self.prev_done] = False
+        truncated[self.prev_done] = False
+        self.prev_done = terminated | truncated
+
+        return observation, reward, terminated, truncated, info
+
+    def close_extras(self, **kwargs):
+        self.detach_viewer()
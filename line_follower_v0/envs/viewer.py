@@ -0,0 +1,105 @@
+import threading
+
+import numpy as np
+import pygame
+
+from .car import Car, Coins
+
+
+class Viewer:
+    """Shows the latest published state of an env from a background thread.
+
+    The env only calls `publish` (a few small copies under a lock) and never waits
+    for drawing, so the simulation runs at full speed. The viewer thread redraws
+    whatever was published last at `fps`; states published in between are simply
+    never shown.
+
+    Use through `LineFollowerEnv.attach_viewer` / `detach_viewer` (or the same
+    methods of `LineFollowerVectorEnv`), which can be called at any time. pygame
+    has a single window, so the viewer refuses to start while one is open (e.g.
+    an env with render_mode="human").
+    """
+    def __init__(self, fps=30, size=(800, 500), caption="Line Follower"):
+        self.fps = fps
+        self.size = size
+        self.caption = caption
+        self._scene = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._inverted = {}  # inverted backgrounds, by track
+
+    def _background(self, track, inverted):
+        if not inverted:
+            return track.background
+        if self._inverted.get("track") is not track:
+            arr = 255 - pygame.surfarray.array3d(track.background)
+            self._inverted = {"track": track, "background": pygame.surfarray.make_surface(arr)}
+        return self._inverted["background"]
+
+    def start(self):
+        assert pygame.display.get_surface() is None, "a pygame window is already open, the viewer would take it over"
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="line-follower-viewer", daemon=True)
+        self._thread.start()
+        return self
+
+    def publish(self, track, position, angle, coins, start, cursor, radius, vals=None, sensor_grid=(4, 6), x_spacing=20, y_spacing=20, inverted=False):
+        """Hand the viewer a new state. Arrays are copied, so the caller may keep mutating its own.
+
+        `inverted` draws the track with inverted colours, for tracks shared by cars
+        that see different colours (the vector env).
+        """
+        scene = dict(
+            track=track,
+            position=np.array(position, dtype=float),
+            angle=float(angle),
+            coins=coins,  # read-only waypoints, shared
+            start=int(start),
+            cursor=int(cursor),
+            radius=radius,
+            vals=None if vals is None else np.array(vals),
+            layout=(tuple(sensor_grid), x_spacing, y_spacing),
+            inverted=bool(inverted),
+        )
+        with self._lock:
+            self._scene = scene
+
+    def _draw(self, canvas, scene, car):
+        canvas.fill((255, 255, 255))
+        canvas.blit(self._background(scene["track"], scene["inverted"]), (0, 0))
+        car.position = scene["position"]
+        car.angle = scene["angle"]
+        coins = Coins(scene["coins"], car, radius=scene["radius"], start=scene["start"])
+        coins.cursor = scene["cursor"]
+        coins.display(canvas)
+        car.display(canvas, vals=scene["vals"])
+
+    def _run(self):
+        owns_display = not pygame.display.get_init()
+        pygame.display.init()
+        window = pygame.display.set_mode(self.size)
+        pygame.display.set_caption(self.caption)
+        clock = pygame.time.Clock()
+        car = layout = shown = None
+        while not self._stop.is_set():
+            with self._lock:
+                scene = self._scene
+            if scene is not None and scene is not shown:
+                if scene["layout"] != layout:
+                    layout = scene["layout"]
+                    sensor_grid, x_spacing, y_spacing = layout
+                    car = Car(sensor_grid=sensor_grid, x_spacing=x_spacing, y_spacing=y_spacing)
+                self._draw(window, scene, car)
+                pygame.display.flip()
+                shown = scene
+            pygame.event.pump()
+            clock.tick(self.fps)
+        if owns_display:
+            pygame.display.quit()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
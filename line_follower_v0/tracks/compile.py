@@ -0,0 +1,58 @@
+"""Compile tracks into single-file bundles (`<name>.track.npz`) that load without decoding.
+
+    python -m line_follower_v0.tracks.compile                 # every track in this folder
+    python -m line_follower_v0.tracks.compile oval path -o ~/my_tracks --packed
+
+A track is compiled from `<name>.png` and `<name>_waypoints.npy`. A `<name>.svg`
+without them is first turned into both with `main.generate` (needs svgpathtools
+and matplotlib). `LineFollowerEnv.find_track` picks a bundle over the loose files.
+"""
+import argparse
+import glob
+import os
+import time
+
+from line_follower_v0.envs.track import BUNDLE_SUFFIX, Track
+
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def track_names(folder):
+    """Names of the tracks in `folder`: every PNG with waypoints, and every SVG."""
+    names = {os.path.basename(p)[:-len("_waypoints.npy")] for p in glob.glob(os.path.join(glob.escape(folder), "*_waypoints.npy"))}
+    names = {name for name in names if os.path.exists(os.path.join(folder, f"{name}.png"))}
+    names |= {os.path.basename(p)[:-len(".svg")] for p in glob.glob(os.path.join(glob.escape(folder), "*.svg"))}
+    return sorted(names)
+
+
+def compile_track(name, folder=FOLDER, out=None, fields=True, packed=False):
+    """Compile one track of `folder` into `<out>/<name>.track.npz` and return the bundle's path."""
+    png_path = os.path.join(folder, f"{name}.png")
+    npy_path = os.path.join(folder, f"{name}_waypoints.npy")
+    if not (os.path.exists(png_path) and os.path.exists(npy_path)):
+        from .main import generate  # svgpathtools + matplotlib, only for SVG-only tracks
+        generate(name, folder)
+    path = os.path.join(out or folder, f"{name}{BUNDLE_SUFFIX}")
+    Track(name, png_path, npy_path).save_bundle(path, fields=fields, packed=packed)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", help="tracks to compile (default: all tracks in --folder)")
+    parser.add_argument("--folder", default=FOLDER, help="where the track sources are (default: the package tracks)")
+    parser.add_argument("-o", "--out", help="where to write the bundles (default: --folder)")
+    parser.add_argument("--packed", action="store_true", help="store the mask bit-packed (8x smaller)")
+    parser.add_argument("--no-fields", dest="fields", action="store_false", help="leave out the centerline distance/progress fields")
+    args = parser.parse_args()
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+    for name in args.names or track_names(args.folder):
+        start = time.perf_counter()
+        path = compile_track(name, args.folder, args.out, args.fields, args.packed)
+        print(f"{path}  {os.path.getsize(path) / 2**20:.1f} MiB  ({time.perf_counter() - start:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
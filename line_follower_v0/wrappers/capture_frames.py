@@ -0,0 +1,177 @@
+import os
+import threading
+from collections import deque
+
+import gymnasium as gym
+import numpy as np
+
+from line_follower_v0.envs import LineFollowerEnv
+from line_follower_v0.envs.main import xrgb_to_rgb
+from line_follower_v0.envs.png import imwrite
+
+POLICIES = ("block", "drop", "drop_oldest")
+
+
+class CaptureFrames(gym.Wrapper):
+    """Records `rgb_array` frames to disk from a worker thread, barely slowing `step()` down.
+
+    The stepping thread only copies each captured frame into a free slot of a
+    fixed pool of `queue_size` frames; a worker thread converts and writes them
+    (zlib and NumPy release the GIL, so it runs alongside the sim). For
+    `LineFollowerEnv` the copy is of the canvas's raw pixels (`render_raw`),
+    and the conversion to RGB happens in the worker too.
+
+    When every slot is still queued, `policy` decides:
+    - "block": wait for the worker (backpressure, nothing is lost);
+    - "drop": skip the new frame;
+    - "drop_oldest": replace the oldest frame not yet written.
+    Dropped frames are counted in `dropped`.
+
+    Args:
+        env (gym.Env): An env with render_mode="rgb_array".
+        directory (str): Where the frames go.
+        format (str, optional): "png" writes `ep<episode>-step<step>.png`; "npy" writes
+            `frames-<k>.npy` chunks of (n, height, width, 3) uint8 and `index-<k>.npy`
+            with the (episode, step) of each frame. Defaults to "png".
+        every (int, optional): Capture steps 0, every, 2*every, ... of each episode
+            (step 0 is the reset). Defaults to 1.
+        episodes (optional): Episodes to capture, counted from 0: a collection of
+            indices or a callable taking the index. Defaults to all.
+        queue_size (int, optional): Frames waiting for the worker at most. Defaults to 32.
+        policy (str, optional): See above. Defaults to "block".
+        chunk (int, optional): Frames per `.npy` chunk. Defaults to 256.
+        level (int, optional): PNG zlib compression level. Defaults to 1.
+    """
+    def __init__(self, env, directory, format="png", every=1, episodes=None, queue_size=32, policy="block", chunk=256, level=1):
+        super().__init__(env)
+        assert env.render_mode == "rgb_array", "CaptureFrames needs render_mode='rgb_array'"
+        assert format in ("png", "npy")
+        assert policy in POLICIES
+        self.directory = directory
+        self.format = format
+        self.every = every
+        if episodes is None or callable(episodes):
+            self.episodes = episodes
+        else:
+            self.episodes = set(episodes).__contains__
+        self.policy = policy
+        self.chunk = chunk
+        self.level = level
+        os.makedirs(directory, exist_ok=True)
+
+        self.raw = isinstance(env.unwrapped, LineFollowerEnv)
+        self.queue_size = queue_size
+        self._pool = None  # frame slots, allocated on the first frame
+        self._free = deque(range(queue_size))
+        self._pending = deque()  # (slot, episode, step), oldest first
+        self._cond = threading.Condition()
+        self._closing = False
+        self._error = None
+        self.episode = -1
+        self.step_id = 0
+        self.captured = self.dropped = self.written = 0
+        self._chunks = 0
+        self._thread = threading.Thread(target=self._run, name="frame-capture", daemon=True)
+        self._thread.start()
+
+    def _wanted(self):
+        if self.step_id % self.every:
+            return False
+        return self.episodes is None or self.episodes(self.episode)
+
+    def _slot(self):
+        """A free slot, or None if the frame is to be dropped. Called with the lock held."""
+        while not self._free:
+            if self.policy == "block":
+                self._cond.wait()
+            elif self.policy == "drop":
+                self.dropped += 1
+                return None
+            else:  # drop_oldest
+                slot, _, _ = self._pending.popleft()
+                self._free.append(slot)
+                self.dropped += 1
+        return self._free.popleft()
+
+    def _capture(self):
+        if self._error is not None:
+            raise self._error
+        if self._pool is None:
+            frame = self.env.unwrapped.render_raw() if self.raw else np.asarray(self.env.render())
+            self._pool = np.empty((self.queue_size, *frame.shape), dtype=frame.dtype)
+        with self._cond:
+            slot = self._slot()
+        if slot is None:
+            return
+        if self.raw:
+            self.env.unwrapped.render_raw(out=self._pool[slot])
+        else:
+            np.copyto(self._pool[slot], self.env.render())
+        with self._cond:
+            self._pending.append((slot, self.episode, self.step_id))
+            self._cond.notify_all()
+        self.captured += 1
+
+    def reset(self, *, seed=None, options=None):
+        obs, info = self.env.reset(seed=seed, options=options)
+        self.episode += 1
+        self.step_id = 0
+        if self._wanted():
+            self._capture()
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self.step_id += 1
+        if self._wanted():
+            self._capture()
+        return obs, reward, terminated, truncated, info
+
+    def _run(self):
+        frames, index = [], []
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if not self._pending:
+                    break
+                slot, episode, step = self._pending.popleft()
+            try:
+                frame = xrgb_to_rgb(self._pool[slot]) if self.raw else self._pool[slot].copy()
+            finally:
+                with self._cond:
+                    self._free.append(slot)
+                    self._cond.notify_all()
+            try:
+                if self.format == "png":
+                    imwrite(os.path.join(self.directory, f"ep{episode:05d}-step{step:06d}.png"), frame, self.level)
+                    self.written += 1
+                else:
+                    frames.append(frame)
+                    index.append((episode, step))
+                    if len(frames) == self.chunk:
+                        self._write_chunk(frames, index)
+            except Exception as e:  # raised again in the stepping thread
+                self._error = e
+        if frames and self._error is None:
+            self._write_chunk(frames, index)
+
+    def _write_chunk(self, frames, index):
+        np.save(os.path.join(self.directory, f"frames-{self._chunks:05d}.npy"), np.stack(frames))
+        np.save(os.path.join(self.directory, f"index-{self._chunks:05d}.npy"), np.array(index, dtype=np.int64))
+        self._chunks += 1
+        self.written += len(frames)
+        frames.clear()
+        index.clear()
+
+    def close(self):
+        """Write every queued frame, then close the env."""
+        if self._thread is not None:
+            with self._cond:
+                self._closing = True
+                self._cond.notify_all()
+            self._thread.join()
+            self._thread = None
+        super().close()
+        if self._error is not None:
+            raise self._error
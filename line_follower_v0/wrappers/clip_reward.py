@@ -1,5 +1,6 @@
 import gymnasium as gym
 import numpy as np
+from gymnasium.vector import VectorRewardWrapper
 
 
 class ClipReward(gym.RewardWrapper):
@@ -11,3 +12,33 @@ class ClipReward(gym.RewardWrapper):
 
     def reward(self, reward):
         return np.clip(reward, self.min_reward, self.max_reward)
+
+
+class ClipVectorReward(VectorRewardWrapper):
+    """`ClipReward` for vector envs: one clip of the whole reward vector, in place when the dtype allows.
+
+    Sub-envs resetting on this step (next-step autoreset) keep the env's
+    placeholder reward unclipped, as a `SyncVectorEnv` of `ClipReward` does.
+    """
+    def __init__(self, env, min_reward, max_reward):
+        super().__init__(env)
+        self.min_reward = min_reward
+        self.max_reward = max_reward
+        self._autoreset = np.zeros(self.num_envs, dtype=bool)
+
+    def reset(self, *, seed=None, options=None):
+        self._autoreset[:] = False
+        return super().reset(seed=seed, options=options)
+
+    def step(self, actions):
+        observations, rewards, terminated, truncated, infos = self.env.step(actions)
+        rewards = self.rewards(rewards)
+        self._autoreset = np.logical_or(terminated, truncated)
+        return observations, rewards, terminated, truncated, infos
+
+    def rewards(self, reward):
+        reward = np.asarray(reward)
+        dtype = np.result_type(reward, self.min_reward, self.max_reward)
+        if dtype != reward.dtype:
+            reward = reward.astype(dtype)
+        return np.clip(reward, self.min_reward, self.max_reward, out=reward, where=~self._autoreset)
@@ -1,5 +1,8 @@
 import gymnasium as gym
+import numpy as np
 from gymnasium.spaces import Discrete
+from gymnasium.vector import VectorActionWrapper
+from gymnasium.vector.utils import batch_space
 
 
 class DiscreteActions(gym.ActionWrapper):
@@ -10,3 +13,15 @@ class DiscreteActions(gym.ActionWrapper):
 
     def action(self, act):
         return self.disc_to_cont[act]
+
+
+class DiscreteVectorActions(VectorActionWrapper):
+    """`DiscreteActions` for vector envs: one gather of all sub-envs' actions from the `disc_to_cont` table."""
+    def __init__(self, env, disc_to_cont):
+        super().__init__(env)
+        self.disc_to_cont = np.asarray(disc_to_cont)
+        self.single_action_space = Discrete(len(disc_to_cont))
+        self.action_space = batch_space(self.single_action_space, self.num_envs)
+
+    def actions(self, actions):
+        return self.disc_to_cont[actions]
@@ -1,4 +1,5 @@
 import gymnasium as gym
+from gymnasium.vector import VectorWrapper
 
 
 class ReacherRewardWrapper(gym.Wrapper):
@@ -14,3 +15,19 @@ class ReacherRewardWrapper(gym.Wrapper):
             + self.reward_ctrl_weight * info["reward_ctrl"]
         )
         return obs, reward, terminated, truncated, info
+
+
+class ReacherVectorRewardWrapper(VectorWrapper):
+    """`ReacherRewardWrapper` for vector envs, weighting the batched `info` arrays."""
+    def __init__(self, env, reward_dist_weight, reward_ctrl_weight):
+        super().__init__(env)
+        self.reward_dist_weight = reward_dist_weight
+        self.reward_ctrl_weight = reward_ctrl_weight
+
+    def step(self, actions):
+        obs, _, terminated, truncated, info = self.env.step(actions)
+        reward = (
+            self.reward_dist_weight * info["reward_dist"]
+            + self.reward_ctrl_weight * info["reward_ctrl"]
+        )
+        return obs, reward, terminated, truncated, info
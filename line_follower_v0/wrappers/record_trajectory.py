@@ -0,0 +1,279 @@
+import glob
+import json
+import os
+import queue
+import threading
+
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+from gymnasium.vector import VectorWrapper
+
+from line_follower_v0.envs import LineFollowerEnv, LineFollowerVectorEnv
+
+
+class ShardWriter:
+    """Fixed-dtype columns written into preallocated ring buffers and flushed as `.npy` shards.
+
+    There are `buffers` buffers of `chunk` rows per column. `append` copies rows
+    into the current buffer; once full, it is handed to a background thread that
+    writes it to `directory/shard-<k>/<column>.npy` through a memory map while
+    `append` carries on in the next buffer. Memory use is fixed, and the caller
+    only waits when every buffer is still being written (the disk is slower
+    than the sim). Each shard is written to a temporary directory and renamed
+    into place, so readers never see half a shard.
+    """
+    def __init__(self, directory, columns, chunk=65536, buffers=3, meta=None):
+        self.directory = directory
+        self.columns = {name: (np.dtype(dtype), tuple(shape)) for name, (dtype, shape) in columns.items()}
+        self.chunk = chunk
+        os.makedirs(directory, exist_ok=True)
+        self.shard = len(glob.glob(os.path.join(glob.escape(directory), "shard-*[0-9]")))
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(dict(
+                meta or {},
+                columns={name: [dtype.str, list(shape)] for name, (dtype, shape) in self.columns.items()},
+            ), f)
+
+        self._buffers = [
+            {name: np.zeros((chunk, *shape), dtype) for name, (dtype, shape) in self.columns.items()}
+            for _ in range(buffers)
+        ]
+        self._free = queue.Queue()
+        for i in range(1, buffers):
+            self._free.put(i)
+        self._full = queue.Queue()
+        self._current = 0
+        self._rows = 0
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="trajectory-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, n=1, **values):
+        """Append `n` rows; each value broadcasts to (n, *column shape), missing columns get zeros."""
+        if self._error is not None:
+            raise self._error
+        done = 0
+        while done < n:
+            rows = min(n - done, self.chunk - self._rows)
+            buffer = self._buffers[self._current]
+            for name, column in buffer.items():
+                value = values.get(name, 0)
+                if np.ndim(value) > len(self.columns[name][1]):
+                    value = value[done:done + rows]
+                column[self._rows:self._rows + rows] = value
+            self._rows += rows
+            done += rows
+            if self._rows == self.chunk:
+                self._hand_over()
+
+    def _hand_over(self):
+        self._full.put((self._current, self._rows))
+        self._current = self._free.get()  # only blocks when every buffer is being written
+        self._rows = 0
+
+    def _write(self, buffer, rows):
+        final = os.path.join(self.directory, f"shard-{self.shard:06d}")
+        tmp = f"{final}.tmp"
+        os.makedirs(tmp, exist_ok=True)
+        for name, column in buffer.items():
+            out = np.lib.format.open_memmap(os.path.join(tmp, f"{name}.npy"), mode="w+", dtype=column.dtype, shape=(rows, *column.shape[1:]))
+            out[:] = column[:rows]
+            out.flush()
+            del out
+        os.replace(tmp, final)
+        self.shard += 1
+
+    def _run(self):
+        while True:
+            item = self._full.get()
+            if item is None:
+                break
+            index, rows = item
+            try:
+                if self._error is None:
+                    self._write(self._buffers[index], rows)
+            except Exception as e:  # raised again in the caller's thread
+                self._error = e
+            self._free.put(index)
+
+    def flush(self):
+        """Write out the rows appended so far, as a (possibly short) shard, and wait for it."""
+        if self._rows:
+            self._hand_over()
+        # every buffer but the current one back in the free queue means all writes are done
+        held = [self._free.get() for _ in range(len(self._buffers) - 1)]
+        for index in held:
+            self._free.put(index)
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        if self._thread is None:
+            return
+        self.flush()
+        self._full.put(None)
+        self._thread.join()
+        self._thread = None
+
+
+def _obs_column(space):
+    """(dtype, shape, bits) to store observations of `space`; MultiBinary is bit-packed."""
+    if isinstance(space, spaces.MultiBinary):
+        n = int(np.prod(space.shape))
+        return np.uint8, ((n + 7) // 8,), n
+    return space.dtype, space.shape, None
+
+
+def _store_obs(obs, bits, n_dims):
+    if bits is None:
+        return obs
+    obs = np.asarray(obs, dtype=np.uint8)
+    return np.packbits(obs.reshape(*obs.shape[:n_dims], -1), axis=-1)
+
+
+def _columns(observation_space, action_space, pose, vector):
+    obs_dtype, obs_shape, bits = _obs_column(observation_space)
+    columns = {
+        "obs": (obs_dtype, obs_shape),
+        "action": (action_space.dtype, action_space.shape),
+        "reward": (np.float32, ()),
+        "terminated": (np.bool_, ()),
+        "truncated": (np.bool_, ()),
+        "first": (np.bool_, ()),  # a reset observation; its action and reward are meaningless
+    }
+    if vector:
+        columns["env"] = (np.int32, ())
+    if pose:
+        columns["position"] = (np.float32, (2,))
+        columns["angle"] = (np.float32, ())
+    return columns, bits
+
+
+class RecordTrajectory(gym.Wrapper):
+    """Streams every observation and transition of an env to `.npy` shards, see `ShardWriter`.
+
+    One row per `reset()` and per `step()`: the observation returned, the action
+    that led to it, reward, terminated/truncated, a `first` flag for reset rows
+    and, for the line follower, the car pose (`position`, `angle`) after the
+    step. MultiBinary observations are stored bit-packed. Read with
+    `TrajectoryReader`.
+
+    Works for `LineFollowerEnv` (v0 and v1) and `SnakeLadderEnv`.
+    """
+    def __init__(self, env, directory, chunk=65536, buffers=3):
+        super().__init__(env)
+        self.pose = isinstance(env.unwrapped, LineFollowerEnv)
+        columns, self.obs_bits = _columns(env.observation_space, env.action_space, self.pose, vector=False)
+        self.writer = ShardWriter(directory, columns, chunk, buffers, meta={"obs_bits": self.obs_bits})
+
+    def _record(self, obs, action=0, reward=0, terminated=False, truncated=False, first=False):
+        values = dict(
+            obs=_store_obs(obs, self.obs_bits, 0), action=action, reward=reward,
+            terminated=terminated, truncated=truncated, first=first,
+        )
+        if self.pose:
+            car = self.env.unwrapped.car
+            values.update(position=car.position, angle=car.angle)
+        self.writer.append(**values)
+
+    def reset(self, *, seed=None, options=None):
+        obs, info = self.env.reset(seed=seed, options=options)
+        self._record(obs, first=True)
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self._record(obs, action, reward, terminated, truncated)
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        self.writer.close()
+        super().close()
+
+
+class RecordVectorTrajectory(VectorWrapper):
+    """Batched `RecordTrajectory` for `LineFollowerVectorEnv` (or another next-step autoreset vector env).
+
+    Each step appends one row per sub-env, with the sub-env in the `env` column.
+    Rows of sub-envs autoresetting on that step are marked `first`.
+    """
+    def __init__(self, env, directory, chunk=65536, buffers=3):
+        super().__init__(env)
+        self.pose = isinstance(env.unwrapped, LineFollowerVectorEnv)
+        columns, self.obs_bits = _columns(env.single_observation_space, env.single_action_space, self.pose, vector=True)
+        self.writer = ShardWriter(directory, columns, chunk, buffers, meta={"obs_bits": self.obs_bits})
+        self._env_ids = np.arange(self.num_envs, dtype=np.int32)
+        self._prev_done = np.zeros(self.num_envs, dtype=bool)
+
+    def _record(self, obs, first, action=0, reward=0, terminated=False, truncated=False):
+        values = dict(
+            obs=_store_obs(obs, self.obs_bits, 1), action=action, reward=reward,
+            terminated=terminated, truncated=truncated, first=first, env=self._env_ids,
+        )
+        if self.pose:
+            values.update(position=self.env.unwrapped.position, angle=self.env.unwrapped.angle)
+        self.writer.append(self.num_envs, **values)
+
+    def reset(self, *, seed=None, options=None):
+        obs, info = self.env.reset(seed=seed, options=options)
+        self._prev_done[:] = False
+        self._record(obs, np.ones(self.num_envs, dtype=bool))
+        return obs, info
+
+    def step(self, actions):
+        obs, reward, terminated, truncated, info = self.env.step(actions)
+        self._record(obs, self._prev_done, actions, reward, terminated, truncated)
+        self._prev_done = terminated | truncated
+        return obs, reward, terminated, truncated, info
+
+    def close(self, **kwargs):
+        self.writer.close()
+        return super().close(**kwargs)
+
+
+class TrajectoryReader:
+    """Streams the shards written by `RecordTrajectory` back as batches of columns.
+
+    Shards are memory-mapped one at a time and batches are slices of them, so
+    nothing is loaded before it is used. Shards still being written are not
+    listed; call `refresh()` to pick up new ones.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        self.obs_bits = meta.get("obs_bits")
+        self.columns = {name: (np.dtype(dtype), tuple(shape)) for name, (dtype, shape) in meta["columns"].items()}
+        self.refresh()
+
+    def refresh(self):
+        self.shards = sorted(glob.glob(os.path.join(glob.escape(self.directory), "shard-*[0-9]")))
+
+    def shard(self, index, columns=None):
+        """The columns of one shard as read-only memory maps."""
+        return {
+            name: np.load(os.path.join(self.shards[index], f"{name}.npy"), mmap_mode="r")
+            for name in (columns or self.columns)
+        }
+
+    def __len__(self):
+        return sum(len(self.shard(i, ["first"])["first"]) for i in range(len(self.shards)))
+
+    def batches(self, batch_size=4096, columns=None, unpack=True):
+        """Yield dicts of column arrays of up to `batch_size` rows, in recording order.
+
+        With `unpack` bit-packed observations are unpacked to bools of shape
+        (rows, obs_bits). Batches never span two shards.
+        """
+        for i in range(len(self.shards)):
+            shard = self.shard(i, columns)
+            rows = len(next(iter(shard.values())))
+            for start in range(0, rows, batch_size):
+                batch = {name: column[start:start + batch_size] for name, column in shard.items()}
+                if unpack and self.obs_bits is not None and "obs" in batch:
+                    batch["obs"] = np.unpackbits(batch["obs"], axis=-1, count=self.obs_bits).astype(bool)
+                yield batch
+
+    def __iter__(self):
+        return self.batches()
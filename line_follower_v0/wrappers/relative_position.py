@@ -1,5 +1,7 @@
 import gymnasium as gym
 from gymnasium.spaces import Box
+from gymnasium.vector import VectorObservationWrapper
+from gymnasium.vector.utils import batch_space
 import numpy as np
 
 
@@ -10,3 +12,14 @@ class RelativePosition(gym.ObservationWrapper):
 
     def observation(self, obs):
         return obs["target"] - obs["agent"]
+
+
+class RelativeVectorPosition(VectorObservationWrapper):
+    """`RelativePosition` for vector envs: one subtraction of the batched dict observations."""
+    def __init__(self, env):
+        super().__init__(env)
+        self.single_observation_space = Box(shape=(2,), low=-np.inf, high=np.inf)
+        self.observation_space = batch_space(self.single_observation_space, self.num_envs)
+
+    def observations(self, observations):
+        return observations["target"] - observations["agent"]
@@ -0,0 +1,141 @@
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+from gymnasium.vector import VectorWrapper
+from gymnasium.vector.utils import batch_space
+
+from line_follower_v0.envs.main import packed_obs_space, pack_obs
+
+MODES = ("packed", "binary")
+
+
+class _BitRing:
+    """The last `k` sensor readings of `n` envs as packed words, in a ring buffer written twice.
+
+    Each reading goes to slots p and p + k of a (n, 2k) buffer, so the last k
+    readings, oldest first, are always the contiguous slice [p + 1, p + k + 1):
+    `view()` returns it without copying or wrapping around.
+    """
+    def __init__(self, n, k, dtype):
+        self.k = k
+        self.buffer = np.zeros((n, 2 * k), dtype=dtype)
+        self.p = 0
+
+    def push(self, words):
+        self.p = (self.p + 1) % self.k
+        self.buffer[:, self.p] = words
+        self.buffer[:, self.p + self.k] = words
+
+    def fill(self, words, mask=None):
+        """Make `words` the whole history (of the envs in `mask`), like an episode start."""
+        if mask is None:
+            self.buffer[:] = np.asarray(words)[:, None]
+        else:
+            self.buffer[mask] = np.asarray(words)[mask, None]
+
+    def view(self):
+        return self.buffer[:, self.p + 1:self.p + 1 + self.k]
+
+
+class _History:
+    """What the single and vector wrappers share: packing readings and shaping the history."""
+    def _setup(self, space, n_envs, k, mode, copy):
+        assert mode in MODES
+        if isinstance(space, spaces.MultiBinary):
+            self.bits = int(np.prod(space.shape))
+            self.word_space = packed_obs_space(self.bits)
+            self.packed_input = False
+        else:
+            # already a `packed_obs_space` word (obs_mode="packed")
+            assert space.shape == () and np.issubdtype(space.dtype, np.unsignedinteger), \
+                "SensorHistory needs MultiBinary or packed sensor observations"
+            self.bits = int(space.high.item()).bit_length()
+            self.word_space = space
+            self.packed_input = True
+        self.k = k
+        self.mode = mode
+        self.copy = copy
+        self.ring = _BitRing(n_envs, k, self.word_space.dtype)
+        if mode == "packed":
+            history_space = spaces.Box(low=0, high=self.word_space.high.item(), shape=(k,), dtype=self.word_space.dtype)
+        else:
+            history_space = spaces.MultiBinary((k, self.bits))
+            # preallocated, so unpacking the history allocates nothing
+            self._masks = np.left_shift(np.ones(1, self.word_space.dtype), np.arange(self.bits, dtype=self.word_space.dtype))
+            self._scratch = np.zeros((n_envs, k, self.bits), dtype=self.word_space.dtype)
+            self._unpacked = np.zeros((n_envs, k, self.bits), dtype=np.int8)
+        return history_space
+
+    def _words(self, obs):
+        if self.packed_input:
+            return np.asarray(obs, dtype=self.word_space.dtype).reshape(-1)
+        obs = np.asarray(obs)
+        return pack_obs(obs.reshape(-1, self.bits), self.word_space.dtype)
+
+    def _history(self):
+        history = self.ring.view()
+        if self.mode == "binary":
+            np.bitwise_and(history[..., None], self._masks, out=self._scratch)
+            np.not_equal(self._scratch, 0, out=self._unpacked, casting="unsafe")
+            history = self._unpacked
+        return history.copy() if self.copy else history
+
+
+class SensorHistory(_History, gym.Wrapper):
+    """The last `k` sensor readings as the observation, kept bit-packed in a preallocated ring buffer.
+
+    Replaces `FrameStackObservation` for the `MultiBinary` (or `obs_mode="packed"`)
+    sensors: a step stores one packed word instead of copying k observations,
+    and a reset fills the history with the first reading (k words).
+
+    Args:
+        env (gym.Env): A line follower with binary or packed sensor observations.
+        k (int, optional): Readings in the history. Defaults to 4.
+        mode (str, optional): "packed" returns the history as k words of shape (k,),
+            oldest first, sensor i in bit i (see `unpack_obs`); "binary" as an
+            int8 array of 0/1 of shape (k, n). Defaults to "packed".
+        copy (bool, optional): Return a copy. By default the observation is a view of
+            the ring buffer, overwritten by the next `step()`. Defaults to False.
+    """
+    def __init__(self, env, k=4, mode="packed", copy=False):
+        gym.Wrapper.__init__(self, env)
+        self.observation_space = self._setup(env.observation_space, 1, k, mode, copy)
+
+    def reset(self, *, seed=None, options=None):
+        obs, info = self.env.reset(seed=seed, options=options)
+        self.ring.fill(self._words(obs))
+        return self._history()[0], info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self.ring.push(self._words(obs))
+        return self._history()[0], reward, terminated, truncated, info
+
+
+class SensorVectorHistory(_History, VectorWrapper):
+    """Batched `SensorHistory`: one ring buffer row per sub-env, observations of shape (num_envs, k, ...).
+
+    Sub-envs that autoreset (next-step mode) start a fresh history on their
+    reset step, the others just push their reading; both are a single NumPy
+    write for the whole batch.
+    """
+    def __init__(self, env, k=4, mode="packed", copy=False):
+        VectorWrapper.__init__(self, env)
+        self.single_observation_space = self._setup(env.single_observation_space, self.num_envs, k, mode, copy)
+        self.observation_space = batch_space(self.single_observation_space, self.num_envs)
+        self._prev_done = np.zeros(self.num_envs, dtype=bool)
+
+    def reset(self, *, seed=None, options=None):
+        obs, info = self.env.reset(seed=seed, options=options)
+        self.ring.fill(self._words(obs))
+        self._prev_done[:] = False
+        return self._history(), info
+
+    def step(self, actions):
+        obs, reward, terminated, truncated, info = self.env.step(actions)
+        words = self._words(obs)
+        self.ring.push(words)
+        if self._prev_done.any():
+            self.ring.fill(words, self._prev_done)
+        self._prev_done = terminated | truncated
+        return self._history(), reward, terminated, truncated, info
@@ -1 +1,2 @@
 from .main import LineFollowerEnv
+from .vector import LineFollowerVectorEnv
@@ -14,26 +14,12 @@ class LineFollowerEnv(LineFollower_v0):
         super().__init__(*args, **kwargs)
         self.action_space = spaces.Box(low=-3.0, high=3.0, shape=(2,), dtype=np.float32)
 
-    def step(self, action):
-        dt = 0.05  # time step
-        left_speed, right_speed = np.clip(
+    def _action_to_speeds(self, action):
+        if self.lean:  # clipped on Python floats, no arrays
+            low, high = self.action_space.low, self.action_space.high
+            return tuple(min(max(float(action[i]), float(low[i])), float(high[i])) for i in range(2))
+        return np.clip(
             action,
             self.action_space.low,
             self.action_space.high
         )
-        self.car.move(left_speed, right_speed, dt)
-        observation =  self._get_obs()
-        reward =  self.car_coins.get_reward()
-
-        self.curr_step += 1
-
-        if self.render_mode == "human":
-            self._render_frame(observation)
-
-        return (
-            observation,
-            reward,
-            False,
-            self.curr_step > self.max_steps,
-            {}
-        )
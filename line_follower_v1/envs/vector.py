@@ -0,0 +1,19 @@
+from gymnasium import spaces
+from gymnasium.vector.utils import batch_space
+import numpy as np
+
+from line_follower_v0.envs import LineFollowerVectorEnv as LineFollowerVector_v0
+
+
+class LineFollowerVectorEnv(LineFollowerVector_v0):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.single_action_space = spaces.Box(low=-3.0, high=3.0, shape=(2,), dtype=np.float32)
+        self.action_space = batch_space(self.single_action_space, self.num_envs)
+
+    def _action_to_speeds(self, actions):
+        return np.clip(
+            actions,
+            self.single_action_space.low,
+            self.single_action_space.high
+        )
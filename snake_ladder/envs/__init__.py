@@ -1 +1 @@
-from .main import SnakeLadderEnv
+from .main import GameState, SnakeLadderEnv
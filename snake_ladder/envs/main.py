@@ -1,8 +1,8 @@
 import gymnasium as gym
 from gymnasium import spaces
-import pygame, os, random
+import os, random
+from collections import namedtuple
 import numpy as np
-from matplotlib import image
 from importlib import resources
 
 WIDTH, HEIGHT = 600, 600
@@ -37,6 +37,9 @@ NPCs = {
     70: 91,
 }
 
+# Everything `step()` changes, see `SnakeLadderEnv.get_state`
+GameState = namedtuple("GameState", ["state", "turns", "rng"])
+
 class SnakeLadderEnv(gym.Env):
     metadata = {"render_modes": ["human"]}
 
@@ -70,6 +73,17 @@ class SnakeLadderEnv(gym.Env):
 
         return self.state, {}
 
+    def get_state(self):
+        """Snapshot of the game, to branch from it later with `set_state`."""
+        return GameState(self.state, self.turns, self.np_random.bit_generator.state)
+
+    def set_state(self, state):
+        """Continue from a `get_state` snapshot. Returns the observation."""
+        self.state = state.state
+        self.turns = state.turns
+        self.np_random.bit_generator.state = state.rng
+        return self.state
+
     def get_reward(self):
         x = self.turns
         return 10**(5-x)
@@ -106,5 +120,6 @@ class SnakeLadderEnv(gym.Env):
 
     def close(self):
         if self.window is not None:
+            import pygame
             pygame.display.quit()
             pygame.quit()